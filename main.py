@@ -69,10 +69,21 @@ def run_django_server():
     execute_from_command_line(['manage.py', 'runserver', '127.0.0.1:8000'])
 
 
+def init_bot_database():
+    """Apply pending bot database migrations before the dashboard reads it"""
+    from discord_bot.database import db
+
+    # The bot only starts from the dashboard, but the dashboard already
+    # needs the current schema (e.g. the global_stats counters)
+    db.init_database()
+
+
 def main():
     """Main entry point"""
     print("\n🚀 Starting Discord Bot with Admin Dashboard...\n")
 
+    init_bot_database()
+
     # Start Discord bot in background thread
     bot_thread = threading.Thread(target=run_discord_bot, daemon=True)
     bot_thread.start()
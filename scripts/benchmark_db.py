@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Benchmark the SQLite conversation store at scale.
+
+Generates a synthetic dataset, then measures latency percentiles and
+throughput of the main database operations, alone and under concurrent
+readers and writers. Results are written as JSON so runs from different
+releases can be compared.
+
+Usage:
+    python scripts/benchmark_db.py --users 10000 --messages-per-user 500
+    python scripts/benchmark_db.py --shards 4 --write-behind --output bench.json
+"""
+
+import argparse
+import contextlib
+import json
+import platform
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# Add parent directory to path for imports
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.discord_bot.database.sharded_db import ShardedDatabase
+from src.discord_bot.database.sqlite_db import SQLiteDatabase
+from src.discord_bot.database.write_behind import PendingMessage
+
+WORDS = [
+    "olá", "como", "você", "está", "hoje", "preciso", "de", "ajuda", "com", "meu",
+    "código", "python", "discord", "bot", "mensagem", "servidor", "canal", "erro",
+    "configuração", "banco", "dados", "sqlite", "consulta", "rápida", "obrigado",
+    "resposta", "exemplo", "documento", "busca", "contexto", "histórico", "usuário"
+]
+
+LOAD_BATCH_SIZE = 5000
+
+
+def random_text(rng: random.Random, min_words: int = 4, max_words: int = 60) -> str:
+    """Build a random sentence from the benchmark vocabulary"""
+    return " ".join(rng.choices(WORDS, k=rng.randint(min_words, max_words)))
+
+
+def latency_stats(samples_ns: List[int], elapsed: float = None) -> Dict:
+    """Summarize latency samples (nanoseconds) as percentiles in milliseconds"""
+    if not samples_ns:
+        return {"count": 0}
+
+    ordered = sorted(samples_ns)
+
+    def percentile(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+        return round(ordered[index] / 1e6, 4)
+
+    total_seconds = elapsed if elapsed is not None else sum(ordered) / 1e9
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) / 1e6, 4),
+        "p50_ms": percentile(50),
+        "p90_ms": percentile(90),
+        "p99_ms": percentile(99),
+        "max_ms": round(ordered[-1] / 1e6, 4),
+        "ops_per_sec": round(len(ordered) / total_seconds, 1) if total_seconds else None
+    }
+
+
+def user_scope(user_index: int, args: argparse.Namespace) -> str:
+    """Get the guild conversation a synthetic user talks in"""
+    return f"guild:{user_index % args.guilds + 1}"
+
+
+def open_database(args: argparse.Namespace, db_path: str):
+    """Open the store under test with the requested layout"""
+    if args.shards > 1:
+        return ShardedDatabase(args.shards, db_path, write_behind=args.write_behind)
+    return SQLiteDatabase(db_path, write_behind=args.write_behind)
+
+
+def shards_of(db) -> List[SQLiteDatabase]:
+    """Get the underlying SQLiteDatabase instances of a store"""
+    return db.shards if isinstance(db, ShardedDatabase) else [db]
+
+
+def generate_dataset(db, args: argparse.Namespace, rng: random.Random) -> Dict:
+    """Bulk-load synthetic users and conversations through the real write path"""
+    start = time.perf_counter()
+    pending: Dict[int, List[PendingMessage]] = {}
+    shards = shards_of(db)
+    total = 0
+
+    def flush(index: int):
+        # Same transaction path as record_turn (stats, rollups, FTS triggers)
+        shards[index]._flush_messages(pending.pop(index))
+
+    for user_index in range(args.users):
+        user_id = f"bench-{user_index}"
+        shard = shards.index(db.shard_for(user_id)) if len(shards) > 1 else 0
+        scope = user_scope(user_index, args)
+
+        for message_index in range(args.messages_per_user):
+            role = "user" if message_index % 2 == 0 else "assistant"
+            batch = pending.setdefault(shard, [])
+            batch.append(PendingMessage.create(
+                user_id, role, random_text(rng), scope,
+                username=f"user{user_index}" if message_index == 0 else None,
+                guild_id=scope.split(":")[1]
+            ))
+            total += 1
+            if len(batch) >= LOAD_BATCH_SIZE:
+                flush(shard)
+
+        if args.verbose and (user_index + 1) % 1000 == 0:
+            print(
+                f"  generated {user_index + 1}/{args.users} users ({total} messages)",
+                file=sys.stderr
+            )
+
+    for shard in list(pending):
+        flush(shard)
+
+    return {
+        "users": args.users,
+        "messages": total,
+        "load_seconds": round(time.perf_counter() - start, 2)
+    }
+
+
+def measure(
+    operation: Callable[[int], None],
+    iterations: int,
+    setup: Optional[Callable[[], None]] = None
+) -> Dict:
+    """
+    Time an operation called with the iteration number.
+
+    ``setup`` runs before every call, outside the timed region, which is
+    also all the throughput is computed from.
+    """
+    samples = []
+    for i in range(iterations):
+        if setup is not None:
+            setup()
+        begin = time.perf_counter_ns()
+        operation(i)
+        samples.append(time.perf_counter_ns() - begin)
+    return latency_stats(samples)
+
+
+def run_latency_benchmarks(db, args: argparse.Namespace, rng: random.Random) -> Dict:
+    """Measure single-threaded latency of each operation"""
+    users = [f"bench-{i}" for i in range(args.users)]
+    indexes = range(args.users)
+    results = {}
+
+    def clear_caches():
+        for shard in shards_of(db):
+            shard._history_cache.clear()
+
+    results["save_message"] = measure(
+        lambda _: db.save_message(rng.choice(users), "user", random_text(rng), "dm"),
+        args.iterations
+    )
+    db.flush()
+
+    def read_history(user_index: int):
+        db.get_conversation_history(
+            users[user_index], token_budget=1500, scope=user_scope(user_index, args)
+        )
+
+    results["get_conversation_history_cold"] = measure(
+        lambda _: read_history(rng.choice(indexes)),
+        args.iterations,
+        setup=clear_caches
+    )
+
+    # Warm: a small working set of active conversations, served from the cache
+    active = rng.sample(indexes, min(len(users), 100))
+    results["get_conversation_history_warm"] = measure(
+        lambda i: read_history(active[i % len(active)]),
+        args.iterations
+    )
+
+    results["get_total_stats"] = measure(
+        lambda _: db.get_total_stats(), args.iterations
+    )
+
+    results["search_messages"] = measure(
+        lambda _: db.search_messages(rng.choice(WORDS), limit=20),
+        max(1, args.iterations // 10)
+    )
+
+    # Destructive: clears distinct users, so it runs last
+    victims = rng.sample(users, min(len(users), args.iterations))
+    results["clear_user_history"] = measure(
+        lambda i: db.clear_user_history(victims[i]),
+        len(victims)
+    )
+
+    return results
+
+
+def run_concurrent_benchmark(db, args: argparse.Namespace) -> Dict:
+    """Run reader and writer threads side by side for a fixed duration"""
+    users = [f"bench-{i}" for i in range(args.users)]
+    samples: Dict[str, List[List[int]]] = {"reader": [], "writer": []}
+    stop = threading.Event()
+
+    def reader(seed: int):
+        rng = random.Random(seed)
+        local: List[int] = []
+        samples["reader"].append(local)
+        while not stop.is_set():
+            user_index = rng.randrange(args.users)
+            begin = time.perf_counter_ns()
+            db.get_conversation_history(
+                users[user_index], token_budget=1500, scope=user_scope(user_index, args)
+            )
+            local.append(time.perf_counter_ns() - begin)
+
+    def writer(seed: int):
+        rng = random.Random(seed)
+        local: List[int] = []
+        samples["writer"].append(local)
+        while not stop.is_set():
+            user_index = rng.randrange(args.users)
+            metadata = {"scope": user_scope(user_index, args)}
+            begin = time.perf_counter_ns()
+            db.record_turn(
+                users[user_index], "bench", random_text(rng), random_text(rng), metadata
+            )
+            local.append(time.perf_counter_ns() - begin)
+
+    threads = [
+        threading.Thread(target=reader, args=(args.seed + i,), daemon=True)
+        for i in range(args.readers)
+    ] + [
+        threading.Thread(target=writer, args=(args.seed + 1000 + i,), daemon=True)
+        for i in range(args.writers)
+    ]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    db.flush()
+
+    return {
+        "readers": args.readers,
+        "writers": args.writers,
+        "duration_seconds": round(elapsed, 2),
+        "read": latency_stats(
+            [s for local in samples["reader"] for s in local], elapsed
+        ),
+        "write": latency_stats(
+            [s for local in samples["writer"] for s in local], elapsed
+        )
+    }
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the SQLite conversation store"
+    )
+    parser.add_argument(
+        "--users", type=int, default=1000, help="Synthetic users to generate"
+    )
+    parser.add_argument(
+        "--messages-per-user", type=int, default=50, help="Messages per synthetic user"
+    )
+    parser.add_argument(
+        "--guilds", type=int, default=20, help="Guilds conversations are spread over"
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=1000, help="Samples per latency benchmark"
+    )
+    parser.add_argument(
+        "--readers", type=int, default=4, help="Concurrent reader threads"
+    )
+    parser.add_argument(
+        "--writers", type=int, default=2, help="Concurrent writer threads"
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=10.0,
+        help="Seconds to run the concurrent benchmark"
+    )
+    parser.add_argument(
+        "--shards", type=int, default=1, help="Number of database shards"
+    )
+    parser.add_argument(
+        "--write-behind", action="store_true", help="Enable write-behind group commits"
+    )
+    parser.add_argument(
+        "--db", help="Database file to use (default: a temporary directory)"
+    )
+    parser.add_argument(
+        "--output", help="Write JSON results to this file instead of stdout"
+    )
+    parser.add_argument(
+        "--seed", type=int, default=42, help="Random seed for reproducible data"
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Print progress to stderr"
+    )
+    return parser.parse_args()
+
+
+def main():
+    """Main function"""
+    args = parse_args()
+    rng = random.Random(args.seed)
+
+    # Database status messages go to stderr so stdout stays valid JSON
+    with tempfile.TemporaryDirectory(prefix="bench-db-") as tmp_dir, \
+            contextlib.redirect_stdout(sys.stderr):
+        db_path = args.db or str(Path(tmp_dir) / "bench.db")
+        db = open_database(args, db_path)
+        db.init_database()
+
+        try:
+            if args.verbose:
+                print("🔧 Generating dataset...", file=sys.stderr)
+            dataset = generate_dataset(db, args, rng)
+
+            if args.verbose:
+                print("⏱️  Running latency benchmarks...", file=sys.stderr)
+            latency = run_latency_benchmarks(db, args, rng)
+
+            if args.verbose:
+                print("🔀 Running concurrent benchmark...", file=sys.stderr)
+            concurrent = run_concurrent_benchmark(db, args)
+        finally:
+            db.close()
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "options": vars(args)
+        },
+        "dataset": dataset,
+        "latency": latency,
+        "concurrent": concurrent
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+        print(f"✅ Results written to {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Django management command to archive messages outside the retention policy
+"""
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Move old messages to the archive database and vacuum the bot database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None, help='Archive messages older than N days'
+        )
+        parser.add_argument(
+            '--per-user',
+            type=int,
+            default=None,
+            help='Keep only the newest N messages of each user conversation'
+        )
+        parser.add_argument(
+            '--vacuum',
+            action='store_true',
+            help=(
+                'Enable incremental auto_vacuum on an existing database first '
+                '(one-time full VACUUM; blocks writes)'
+            )
+        )
+
+    def handle(self, *_args, **options):
+        sys.path.insert(0, str(Path(__file__).resolve().parents[4]))
+        from discord_bot.database.retention import RetentionPolicy
+        from discord_bot.database.sqlite_db import db
+
+        policy = RetentionPolicy(
+            max_age_days=options['days'], keep_per_user=options['per_user']
+        )
+
+        if options['vacuum']:
+            db.init_database()
+            if db.enable_incremental_vacuum():
+                self.stdout.write(
+                    self.style.SUCCESS('✅ Incremental auto_vacuum enabled')
+                )
+            else:
+                self.stdout.write('Incremental auto_vacuum was already enabled')
+
+        if not policy.enabled:
+            self.stdout.write(self.style.WARNING(
+                'No retention rule configured '
+                '(use --days/--per-user or MESSAGE_RETENTION_* settings)'
+            ))
+            return
+
+        db.init_database()
+        result = db.archive_old_messages(policy)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"✅ Archived {result['archived']} messages")
+        )
+        self.stdout.write(f"   Freed pages: {result['freed_pages']}")
+        if not db.incremental_vacuum_enabled():
+            self.stdout.write(self.style.WARNING(
+                'Incremental auto_vacuum is off, so the file does not shrink; '
+                'run once with --vacuum to enable it'
+            ))
@@ -0,0 +1,24 @@
+"""
+Django management command to rebuild the bot's global statistics counters
+"""
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the global stats counters from a full count of users and messages'
+
+    def handle(self, *_args, **_options):
+        sys.path.insert(0, str(Path(__file__).resolve().parents[4]))
+        from discord_bot.database.sqlite_db import db
+
+        db.init_database()
+        stats = db.reconcile_global_stats()
+
+        self.stdout.write(self.style.SUCCESS('✅ Global stats reconciled!'))
+        self.stdout.write(f"   Users: {stats['total_users']}")
+        self.stdout.write(f"   Messages: {stats['total_messages']}")
+        self.stdout.write(f"   User messages: {stats['user_messages']}")
+        self.stdout.write(f"   Bot responses: {stats['bot_responses']}")
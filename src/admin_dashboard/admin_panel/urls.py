@@ -18,10 +18,18 @@ urlpatterns = [
 
     # Monitoring APIs
     path('api/stats', views.api_stats, name='api_stats'),
+    path(
+        'api/stats/timeseries',
+        views.api_stats_timeseries,
+        name='api_stats_timeseries'
+    ),
     path('api/uptime', views.api_uptime, name='api_uptime'),
     path('api/logs/stream', views.api_logs_stream, name='api_logs_stream'),
     path('api/logs/export', views.api_logs_export, name='api_logs_export'),
 
+    # Conversation APIs
+    path('api/messages/search', views.api_messages_search, name='api_messages_search'),
+
     # Embeddings APIs
     path('api/embeddings/stats', views.api_embeddings_stats, name='api_embeddings_stats'),
     path('api/embeddings/clear', views.api_embeddings_clear, name='api_embeddings_clear'),
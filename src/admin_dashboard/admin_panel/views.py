@@ -2,7 +2,7 @@
 import json
 import os
 import psutil
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
 
 from django.contrib.auth import authenticate, login, logout
@@ -46,10 +46,10 @@ def dashboard_view(request):
     # Import here to avoid circular imports
     import sys
     sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
-    from discord_bot.database.sqlite_db import db
+    from discord_bot.database.sqlite_db import readonly_db
 
     # Get bot stats
-    stats = db.get_total_stats()
+    stats = readonly_db.get_total_stats()
     bot_status = bot_manager.get_status()
 
     # System stats
@@ -121,9 +121,12 @@ def api_stats(request):
     """Get bot statistics"""
     import sys
     sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
-    from discord_bot.database.sqlite_db import db
+    from discord_bot.bot.ai_client import ai_client
+    from discord_bot.bot.scheduler import ai_scheduler
+    from discord_bot.database.sqlite_db import db, readonly_db
+    from discord_bot.utils.circuit_breaker import circuit_breaker_states
 
-    stats = db.get_total_stats()
+    stats = readonly_db.get_total_stats()
 
     # System stats
     process = psutil.Process()
@@ -135,10 +138,94 @@ def api_stats(request):
 
     return JsonResponse({
         'bot_stats': stats,
+        'history_cache': db.get_cache_stats(),
+        'ai_requests': ai_client.get_stats(),
+        'response_cache': ai_client.cache.stats() if ai_client.cache else None,
+        'ai_scheduler': ai_scheduler.snapshot(),
+        'circuit_breakers': circuit_breaker_states(),
         'system_stats': system_stats,
     })
 
 
+@login_required
+@require_http_methods(["GET"])
+def api_stats_timeseries(request):
+    """Get bot activity over time from the hourly rollups"""
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+    from discord_bot.database.sqlite_db import readonly_db
+
+    # Range defaults to the last 7 days; times without an offset are UTC
+    try:
+        end = _parse_utc(request.GET['to']) if request.GET.get('to') else (
+            datetime.now(timezone.utc).replace(tzinfo=None)
+        )
+        start = _parse_utc(request.GET['from']) if request.GET.get('from') else (
+            end - timedelta(days=7)
+        )
+        step_hours = _parse_step_hours(request.GET.get('step', '1h'))
+    except ValueError as e:
+        return JsonResponse({'error': f'Invalid parameter: {e}'}, status=400)
+
+    if start >= end:
+        return JsonResponse({'error': '"from" must be before "to"'}, status=400)
+
+    result = readonly_db.get_activity_timeseries(
+        start,
+        end,
+        step_hours,
+        guild_id=request.GET.get('guild_id') or None
+    )
+    return JsonResponse({
+        'from': start.isoformat(),
+        'to': end.isoformat(),
+        **result
+    })
+
+
+def _parse_utc(value: str) -> datetime:
+    """Parse an ISO date or datetime into a naive UTC datetime"""
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def _parse_step_hours(step: str) -> int:
+    """Parse a step like "1h", "6h" or "1d" (plain numbers are hours)"""
+    step = step.strip().lower()
+    hours = int(step[:-1]) * 24 if step.endswith('d') else int(step.rstrip('h'))
+    if hours < 1:
+        raise ValueError('step must be at least 1h')
+    return hours
+
+
+@login_required
+@require_http_methods(["GET"])
+def api_messages_search(request):
+    """Full-text search over conversation history"""
+    import sys
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent.parent.parent))
+    from discord_bot.database.sqlite_db import readonly_db
+
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'error': 'Missing search query (q)'}, status=400)
+
+    try:
+        # The cursor is opaque: an id, or one position per shard when sharded
+        result = readonly_db.search_messages(
+            query,
+            user_id=request.GET.get('user_id') or None,
+            limit=int(request.GET.get('limit', 20)),
+            cursor=request.GET.get('cursor') or None
+        )
+    except ValueError:
+        return JsonResponse({'error': 'Invalid limit or cursor'}, status=400)
+
+    return JsonResponse(result)
+
+
 @login_required
 @require_http_methods(["GET"])
 def api_uptime(request):
@@ -3,5 +3,6 @@
 from .client import DiscordBot
 from .ai_client import ai_client
 from .commands import command_handler
+from .summarizer import conversation_summarizer
 
-__all__ = ["DiscordBot", "ai_client", "command_handler"]
+__all__ = ["DiscordBot", "ai_client", "command_handler", "conversation_summarizer"]
@@ -1,78 +1,641 @@
 """
 AI client for OpenRouter API interactions.
 """
-from typing import List, Dict, Optional
+import asyncio
+import json
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import (
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import aiohttp
 
 from ..config.settings import settings
+from ..utils.circuit_breaker import (
+    TRANSIENT_STATUSES,
+    CircuitOpenError,
+    get_circuit_breaker,
+)
+from .context_window import ContextWindow
+from .model_router import ModelRouter
+from .response_cache import ResponseCache, response_cache, response_cache_key
+from .scheduler import RequestScheduler, ai_scheduler
+from .single_flight import SingleFlight
+
+T = TypeVar("T")
+
+# Statuses worth retrying: timeouts, throttling and transient upstream failures
+RETRYABLE_STATUSES = TRANSIENT_STATUSES
+
+
+class AIClientError(Exception):
+    """Raised when a request to the OpenRouter API fails"""
+
+    def __init__(
+        self,
+        message: str,
+        status: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: bool = False
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.retryable = retryable or status in RETRYABLE_STATUSES
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (seconds or HTTP date) into seconds to wait"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+CIRCUIT_OPEN_MESSAGE = (
+    "⚠️ O serviço de IA está temporariamente indisponível. "
+    "Tente novamente em alguns instantes."
+)
+
+TIMEOUT_MESSAGE = "Error processing your message: AI request timed out"
+
+EMPTY_RESPONSE_MESSAGE = "⚠️ O modelo não gerou uma resposta. Tente novamente."
+
+MISSING_API_KEY_MESSAGE = (
+    "Error: OPENROUTER_API_KEY not configured. "
+    "Please add the key to environment variables."
+)
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Whether an error points at an unhealthy upstream rather than a bad request"""
+    if isinstance(error, AIClientError):
+        # Rejected requests (4xx) say nothing about the upstream's health;
+        # throttling, 5xx, timeouts, dropped connections and broken
+        # responses do
+        return error.retryable or error.status is None
+    return True
 
 
 class AIClient:
     """Client for interacting with OpenRouter API"""
 
-    def __init__(self, api_key: str = None, base_url: str = None, model: str = None):
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        model: str = None,
+        cache: Optional[ResponseCache] = None,
+        scheduler: Optional[RequestScheduler] = None
+    ):
         self.api_key = api_key or settings.OPENROUTER_API_KEY
         self.base_url = base_url or settings.OPENROUTER_BASE_URL
-        self.model = model or settings.OPENROUTER_MODEL
+        # An explicit model pins the client to it; otherwise route over the pool
+        if model:
+            models = [model]
+        else:
+            models = settings.OPENROUTER_MODELS or [settings.OPENROUTER_MODEL]
+        self.router = ModelRouter(models)
+        # Preferred model, used for per-model settings such as token budgets
+        self.model = self.router.models[0]
+        self.context_window = ContextWindow(self.router.models)
+        # Identical requests in flight at the same time share one upstream call
+        self._single_flight = SingleFlight()
+        # Shared with every client of the same upstream
+        self._breaker = get_circuit_breaker("openrouter")
+        # Admits upstream calls fairly under the global concurrency limit
+        self.scheduler = scheduler or ai_scheduler
+        # Responses to repeated prompts (None when RESPONSE_CACHE_ENABLED is off)
+        if cache is None and settings.RESPONSE_CACHE_ENABLED:
+            cache = response_cache
+        self.cache = cache
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {
+            "requests": 0,
+            "attempts": 0,
+            "retries": 0,
+            "failures": 0,
+            "deadline_exceeded": 0,
+            "short_circuited": 0,
+            "prompts_trimmed": 0
+        }
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """
+        Get the shared HTTP session, creating it on the running loop.
+
+        Connections are kept alive and reused across requests, so a reply
+        does not pay DNS, TCP and TLS setup. A new session is created if
+        the previous one was closed or belongs to another event loop (the
+        bot was restarted).
+        """
+        loop = asyncio.get_running_loop()
+        session = self._session
+        if session is None or session.closed or self._session_loop is not loop:
+            connector = aiohttp.TCPConnector(
+                limit=settings.AI_HTTP_POOL_SIZE,
+                limit_per_host=settings.AI_HTTP_POOL_SIZE_PER_HOST,
+                ttl_dns_cache=settings.AI_HTTP_DNS_CACHE_TTL,
+                keepalive_timeout=settings.AI_HTTP_KEEPALIVE_TIMEOUT
+            )
+            self._session = aiohttp.ClientSession(connector=connector)
+            self._session_loop = loop
+        return self._session
+
+    async def close(self):
+        """Close the shared HTTP session"""
+        session, self._session = self._session, None
+        # A session can only be closed on the loop that created it
+        if (
+            session is not None
+            and not session.closed
+            and self._session_loop is asyncio.get_running_loop()
+        ):
+            await session.close()
 
     async def get_response(
         self,
         user_message: str,
         conversation_history: List[Dict] = None,
-        rag_context: Optional[str] = None
+        rag_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None,
+        use_cache: bool = True,
+        user_id: str = "",
+        group: Optional[str] = None,
+        raise_errors: bool = False
     ) -> str:
         """
         Get AI response from OpenRouter.
 
+        Cached answers are returned at once; only the upstream call waits
+        for a scheduler slot, and identical requests in flight share one.
+
         Args:
             user_message: The user's current message
             conversation_history: List of previous messages
             rag_context: Optional context from RAG search
+            conversation_summary: Optional summary of older conversation turns
+            use_cache: Serve and store the answer in the response cache
+            user_id: User the request is made for, for fair scheduling
+            group: Fair-share group, normally the guild id; None means a
+                direct message
+            raise_errors: Raise failures instead of returning their
+                message in place of the answer
+
+        Returns:
+            AI response text, or the error message if the request failed
+
+        Raises:
+            AIClientError: If the request fails and raise_errors is set
+        """
+        try:
+            if not self.api_key:
+                raise AIClientError(MISSING_API_KEY_MESSAGE)
+
+            messages = self._build_messages(
+                user_message, conversation_history, rag_context, conversation_summary
+            )
+
+            cache_key = self._cache_key(messages) if use_cache else None
+            if cache_key is not None:
+                cached = await self.cache.aget(cache_key)
+                if cached is not None:
+                    return cached
+
+            async def request() -> str:
+                async with self.scheduler.slot(user_id, group):
+                    return await self.complete(messages)
+
+            if settings.AI_COALESCE_REQUESTS:
+                # Same key as the response cache: same model pool and prompt.
+                # The shared call holds a single slot for all its callers
+                key = cache_key or response_cache_key(
+                    ",".join(self.router.models), messages
+                )
+                response = await self._single_flight.run(key, request)
+            else:
+                response = await request()
+        except AIClientError as e:
+            if raise_errors:
+                raise
+            return str(e)
+
+        # Only successful answers are cached
+        if cache_key is not None:
+            await self.cache.aset(cache_key, response)
+        return response
+
+    async def stream_response(
+        self,
+        user_message: str,
+        conversation_history: List[Dict] = None,
+        rag_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None,
+        use_cache: bool = True,
+        user_id: str = "",
+        group: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the AI response from OpenRouter as it is generated.
+
+        A scheduler slot is held from the request until the stream ends;
+        cached answers need none.
+
+        Args:
+            user_message: The user's current message
+            conversation_history: List of previous messages
+            rag_context: Optional context from RAG search
+            conversation_summary: Optional summary of older conversation turns
+            use_cache: Serve and store the answer in the response cache
+            user_id: User the request is made for, for fair scheduling
+            group: Fair-share group, normally the guild id; None means a
+                direct message
+
+        Yields:
+            Successive pieces of the response text (a cached answer arrives
+            as a single piece)
+
+        Raises:
+            AIClientError: If the request fails, before or during streaming
+        """
+        if not self.api_key:
+            raise AIClientError(MISSING_API_KEY_MESSAGE)
+
+        messages = self._build_messages(
+            user_message, conversation_history, rag_context, conversation_summary
+        )
+
+        cache_key = self._cache_key(messages) if use_cache else None
+        if cache_key is not None:
+            cached = await self.cache.aget(cache_key)
+            if cached is not None:
+                yield cached
+                return
+
+        chunks = []
+        async with self.scheduler.slot(user_id, group):
+            async for chunk in self.stream_complete(messages):
+                chunks.append(chunk)
+                yield chunk
+
+        # Reached only when the stream completed without error
+        if cache_key is not None and chunks:
+            await self.cache.aset(cache_key, "".join(chunks))
+
+    def _cache_key(self, messages: List[Dict[str, str]]) -> Optional[str]:
+        """Get the response cache key of a request, or None if caching is off"""
+        if self.cache is None:
+            return None
+        # Any model of the pool may have answered, so the key covers the pool
+        return response_cache_key(",".join(self.router.models), messages)
+
+    def _build_messages(
+        self,
+        user_message: str,
+        conversation_history: List[Dict] = None,
+        rag_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Build the messages array: system prompt, history, then the user message.
+
+        The prompt is trimmed to the models' context window, so a request
+        that could not fit is never sent.
+
+        Raises:
+            AIClientError: If even the bare system prompt does not fit
+        """
+        try:
+            prompt = self.context_window.fit(
+                user_message, conversation_history, rag_context, conversation_summary
+            )
+        except ValueError as e:
+            raise AIClientError(f"Error processing your message: {str(e)}") from e
+
+        if any(prompt.trimmed.values()):
+            self.stats["prompts_trimmed"] += 1
+        return prompt.messages
+
+    async def summarize(
+        self,
+        messages: List[Dict[str, str]],
+        previous_summary: Optional[str] = None
+    ) -> Tuple[str, int]:
+        """
+        Condense conversation turns into a short summary.
+
+        The request is trimmed to the models' context window like any
+        other; turns that do not fit are left for the next summary.
+
+        Args:
+            messages: Turns to summarize, in chronological order
+            previous_summary: Existing summary to extend with these turns
+
+        Returns:
+            Updated summary text, and how many of the turns (oldest first)
+            it covers
+
+        Raises:
+            AIClientError: If the prompt cannot fit or the API call fails
+        """
+        try:
+            prompt = self.context_window.fit_summary(messages, previous_summary)
+        except ValueError as e:
+            raise AIClientError(f"Error summarizing conversation: {str(e)}") from e
+
+        if any(prompt.trimmed.values()):
+            self.stats["prompts_trimmed"] += 1
+        summary = await self.complete(prompt.messages)
+        return summary, len(messages) - prompt.trimmed["history"]
+
+    async def complete(self, messages: List[Dict[str, str]]) -> str:
+        """
+        Send a chat completion request to OpenRouter.
+
+        The model is picked by the router, which fails over to the next
+        model on errors and may hedge slow requests. Throttled, failed and
+        dropped requests to each model are retried (see ``_with_retries``).
+        Failover, hedges and retries all share one ``AI_REQUEST_DEADLINE``.
+
+        Args:
+            messages: Full messages array, including the system message
 
         Returns:
             AI response text
+
+        Raises:
+            AIClientError: If the API key is missing or the request fails
+        """
+        if not self.api_key:
+            raise AIClientError("OPENROUTER_API_KEY not configured")
+
+        deadline = asyncio.get_running_loop().time() + settings.AI_REQUEST_DEADLINE
+
+        async def attempt(model: str) -> str:
+            # Build payload
+            payload = {
+                "model": model,
+                "messages": messages
+            }
+            return await self._with_retries(
+                lambda: self._complete_once(payload), deadline
+            )
+
+        return await self._through_breaker(
+            lambda: self.router.run(attempt, deadline=deadline)
+        )
+
+    async def _complete_once(self, payload: Dict) -> str:
+        """Make a single completion request"""
+        async with self._get_session().post(
+            self.base_url,
+            json=payload,
+            headers=self._headers()
+        ) as response:
+            if response.status != 200:
+                raise await self._response_error(response)
+            data = await response.json()
+            return data["choices"][0]["message"]["content"]
+
+    async def stream_complete(
+        self,
+        messages: List[Dict[str, str]]
+    ) -> AsyncIterator[str]:
+        """
+        Send a streaming chat completion request to OpenRouter.
+
+        The response is read as server-sent events: ``data:`` lines carry
+        JSON chunks, ``data: [DONE]`` ends the stream and lines starting
+        with ``:`` are keep-alive comments.
+
+        Args:
+            messages: Full messages array, including the system message
+
+        Yields:
+            Successive pieces of the response text
+
+        Raises:
+            AIClientError: If the API key is missing or the request fails
         """
         if not self.api_key:
-            return "Error: OPENROUTER_API_KEY not configured. Please add the key to environment variables."
+            raise AIClientError("OPENROUTER_API_KEY not configured")
+
+        deadline = asyncio.get_running_loop().time() + settings.AI_REQUEST_DEADLINE
 
-        headers = {
+        async def attempt(model: str) -> aiohttp.ClientResponse:
+            payload = {
+                "model": model,
+                "messages": messages,
+                "stream": True
+            }
+            return await self._with_retries(
+                lambda: self._open_stream(payload), deadline
+            )
+
+        # Only opening the stream is retried or failed over: once text has
+        # been yielded, a new request would repeat it. Not hedged, since a
+        # losing stream that already opened would leak its connection
+        response = await self._through_breaker(
+            lambda: self.router.run(attempt, hedge=False, deadline=deadline)
+        )
+
+        try:
+            async with response:
+                async for raw_line in response.content:
+                    line = raw_line.decode("utf-8").strip()
+                    if not line or line.startswith(":") or not line.startswith("data:"):
+                        continue
+
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+
+                    chunk = json.loads(data)
+                    error = chunk.get("error")
+                    if error:
+                        # Errors after the stream started arrive as a chunk
+                        detail = error
+                        if isinstance(error, dict):
+                            detail = error.get("message", error)
+                        raise AIClientError(f"Error from AI: {detail}")
+
+                    choices = chunk.get("choices") or []
+                    delta = choices[0].get("delta", {}) if choices else {}
+                    content = delta.get("content")
+                    if content:
+                        yield content
+        except AIClientError:
+            raise
+        except Exception as e:
+            raise AIClientError(f"Error processing your message: {str(e)}") from e
+
+    async def _open_stream(self, payload: Dict) -> aiohttp.ClientResponse:
+        """Start a streaming request and return the response once headers arrive"""
+        response = await self._get_session().post(
+            self.base_url,
+            json=payload,
+            headers=self._headers()
+        )
+        if response.status != 200:
+            try:
+                raise await self._response_error(response)
+            finally:
+                response.release()
+        return response
+
+    def _headers(self) -> Dict[str, str]:
+        """Get the request headers"""
+        return {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
 
-        # Build system message
-        system_message = settings.get_system_prompt(rag_context)
+    @staticmethod
+    async def _response_error(response: aiohttp.ClientResponse) -> AIClientError:
+        """Build the error for a non-200 response"""
+        error_text = await response.text()
+        return AIClientError(
+            f"Error connecting to AI (status {response.status}): {error_text}",
+            status=response.status,
+            retry_after=parse_retry_after(response.headers.get("Retry-After"))
+        )
 
-        # Build messages array
-        messages = [{"role": "system", "content": system_message}]
+    async def _through_breaker(self, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run one logical request through the OpenRouter circuit breaker.
 
-        if conversation_history:
-            messages.extend(conversation_history)
+        The breaker sees a single outcome per request, after retries and
+        failover, so one user's retries cannot open the circuit alone.
 
-        messages.append({"role": "user", "content": user_message})
+        Args:
+            request: Makes the request, including its retries and failover
 
-        # Build payload
-        payload = {
-            "model": self.model,
-            "messages": messages
-        }
+        Returns:
+            Result of the request
 
+        Raises:
+            AIClientError: If the request fails or the circuit is open
+        """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url,
-                    json=payload,
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        return data["choices"][0]["message"]["content"]
-                    else:
-                        error_text = await response.text()
-                        return f"Error connecting to AI (status {response.status}): {error_text}"
-        except Exception as e:
-            return f"Error processing your message: {str(e)}"
+            return await self._breaker.call(request, is_failure=_is_upstream_failure)
+        except CircuitOpenError as e:
+            # Upstream known to be down: fail in milliseconds, not after a timeout
+            self.stats["short_circuited"] += 1
+            self.stats["failures"] += 1
+            raise AIClientError(CIRCUIT_OPEN_MESSAGE) from e
+
+    async def _with_retries(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        deadline: float
+    ) -> T:
+        """
+        Run a request, retrying transient failures.
+
+        Throttling (429), transient upstream errors (5xx) and dropped
+        connections are retried up to ``AI_MAX_RETRIES`` times. The wait
+        before each retry grows exponentially with full jitter, so clients
+        throttled together do not retry together, and is never shorter than
+        the server's ``Retry-After``. All attempts and waits must finish by
+        ``deadline``; a retry that could not finish in time is not
+        attempted.
+
+        Args:
+            attempt: Makes one request and returns its result
+            deadline: Event loop time by which the request must be done,
+                shared with the other models the request may go to
+
+        Returns:
+            Result of the first successful attempt
+
+        Raises:
+            AIClientError: If the request fails and cannot be retried, the
+                retries are exhausted or the deadline is reached
+        """
+        loop = asyncio.get_running_loop()
+        self.stats["requests"] += 1
+
+        retries = 0
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self.stats["deadline_exceeded"] += 1
+                self.stats["failures"] += 1
+                raise AIClientError(TIMEOUT_MESSAGE)
+            self.stats["attempts"] += 1
+            try:
+                return await asyncio.wait_for(attempt(), timeout=remaining)
+            except AIClientError as e:
+                error = e
+            except asyncio.TimeoutError as e:
+                if loop.time() >= deadline:
+                    self.stats["deadline_exceeded"] += 1
+                    self.stats["failures"] += 1
+                    raise AIClientError(TIMEOUT_MESSAGE) from e
+                # Timed out by the HTTP client itself (e.g. while connecting)
+                error = AIClientError(TIMEOUT_MESSAGE, retryable=True)
+                error.__cause__ = e
+            except aiohttp.ClientConnectionError as e:
+                error = AIClientError(
+                    f"Error processing your message: {str(e)}", retryable=True
+                )
+                error.__cause__ = e
+            except Exception as e:
+                self.stats["failures"] += 1
+                raise AIClientError(f"Error processing your message: {str(e)}") from e
+
+            if not error.retryable or retries >= settings.AI_MAX_RETRIES:
+                self.stats["failures"] += 1
+                raise error
+
+            delay = self._retry_delay(retries, error.retry_after)
+            if loop.time() + delay >= deadline:
+                self.stats["deadline_exceeded"] += 1
+                self.stats["failures"] += 1
+                raise error
+
+            retries += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_delay(retries: int, retry_after: Optional[float] = None) -> float:
+        """Get the wait before the next retry (exponential backoff, full jitter)"""
+        cap = min(
+            settings.AI_RETRY_MAX_DELAY, settings.AI_RETRY_BASE_DELAY * (2 ** retries)
+        )
+        delay = random.uniform(0, cap)
+        if retry_after is not None:
+            # Honor the server, plus jitter so throttled clients spread out
+            delay = retry_after + random.uniform(0, settings.AI_RETRY_BASE_DELAY)
+        return delay
+
+    def get_stats(self) -> Dict:
+        """Get request and retry counters, routing and coalescing stats"""
+        return dict(
+            self.stats,
+            routing=self.router.snapshot(),
+            coalescing=self._single_flight.stats()
+        )
 
 
 # Singleton instance
@@ -1,15 +1,32 @@
 """
 Discord bot client and event handlers.
 """
-import discord
+import asyncio
 import time
+from typing import AsyncIterator, Optional
+
+import discord
 
 from ..config.settings import settings
+from ..database.retention import RetentionPolicy
 from ..database.sqlite_db import db
+from ..utils.logging_config import logger as bot_logger
+
 # from ..rag.vector_store import vector_store  # Temporarily disabled due to ChromaDB dependency issues
-from .ai_client import ai_client
+from .ai_client import EMPTY_RESPONSE_MESSAGE, AIClientError, ai_client
 from .commands import command_handler
-from ..utils.logging_config import logger as bot_logger
+from .response_cache import response_cache
+from .scope import conversation_scope
+from .summarizer import conversation_summarizer
+
+
+class _BotClient(discord.Client):
+    """Discord client that also releases the bot's own resources on close"""
+
+    async def close(self):
+        """Close the AI HTTP session, then the Discord connection"""
+        await ai_client.close()
+        await super().close()
 
 
 class DiscordBot:
@@ -21,7 +38,8 @@ class DiscordBot:
         intents.members = False
         intents.presences = False
 
-        self.client = discord.Client(intents=intents)
+        self.client = _BotClient(intents=intents)
+        self._retention_task = None
         self._setup_events()
 
     def _setup_events(self):
@@ -40,6 +58,11 @@ class DiscordBot:
                 bot_logger.get_logger().error(f"Failed to initialize database: {e}")
                 return
 
+            # on_ready fires again after reconnects; keep a single retention job
+            retention_idle = self._retention_task is None or self._retention_task.done()
+            if RetentionPolicy().enabled and retention_idle:
+                self._retention_task = asyncio.create_task(self._run_retention())
+
             # vector_store.init_vector_db()  # Temporarily disabled
             bot_logger.get_logger().warning("RAG system temporarily disabled due to ChromaDB dependency issues")
 
@@ -122,21 +145,45 @@ class DiscordBot:
                 return
 
             # Handle conversational messages
-            await self._handle_conversation(message, user_id, username, user_message)
+            scope = conversation_scope(message)
+            await self._handle_conversation(
+                message, user_id, username, user_message, scope
+            )
+
+    async def _run_retention(self):
+        """Periodically archive messages outside the retention policy"""
+        while True:
+            start_time = time.time()
+            try:
+                # Runs in its own thread: the job is long but only holds the
+                # write lock per batch, so chat turns keep flowing meanwhile
+                result = await asyncio.to_thread(db.archive_old_messages)
+                bot_logger.log_bot_event("messages_archived", **result)
+                bot_logger.log_performance(
+                    "message_retention", (time.time() - start_time) * 1000
+                )
+            except Exception as e:
+                bot_logger.get_logger().error(f"Message retention failed: {e}")
+
+            await asyncio.sleep(settings.RETENTION_INTERVAL_HOURS * 3600)
 
     async def _handle_conversation(
         self,
         message: discord.Message,
         user_id: str,
         username: str,
-        user_message: str
+        user_message: str,
+        scope: str
     ):
         """Handle conversational messages with AI"""
-        # Add/update user
-        db.add_user(user_id, username)
+        start_time = time.time()
 
-        # Get conversation history
-        history = db.get_conversation_history(user_id)
+        # Get the summary and the conversation history it does not cover yet
+        history, summary = await db.aget_conversation_context(
+            user_id,
+            token_budget=settings.get_history_token_budget(ai_client.model),
+            scope=scope
+        )
 
         # Search for relevant documents (RAG) - Temporarily disabled
         rag_context = None
@@ -144,22 +191,57 @@ class DiscordBot:
         # if similar_docs:
         #     rag_context = "\n\n".join([doc['text'] for doc in similar_docs])
 
-        # Save user message
-        db.save_message(user_id, "user", user_message)
+        summary_text = summary["summary"] if summary else None
+        use_cache = (
+            str(message.channel.id) not in settings.RESPONSE_CACHE_DISABLED_CHANNELS
+        )
+
+        guild_id = str(message.guild.id) if message.guild else None
 
         # Get AI response
         async with message.channel.typing():
-            ai_response = await ai_client.get_response(
-                user_message,
-                history,
-                rag_context
-            )
+            if settings.AI_STREAMING:
+                # Post the reply as it is generated
+                ai_response = await self._send_streamed_response(
+                    message.channel,
+                    ai_client.stream_response(
+                        user_message, history, rag_context, summary_text, use_cache,
+                        user_id=user_id, group=guild_id
+                    )
+                )
+            else:
+                try:
+                    ai_response = await ai_client.get_response(
+                        user_message,
+                        history,
+                        rag_context,
+                        summary_text,
+                        use_cache,
+                        user_id=user_id,
+                        group=guild_id,
+                        raise_errors=True
+                    )
+                except AIClientError as e:
+                    await self._send_response(message.channel, str(e))
+                    ai_response = None
+                else:
+                    # Send response (split if too long)
+                    await self._send_response(message.channel, ai_response)
+
+            if ai_response is None:
+                # The user saw the error, but it must not become part of the
+                # conversation the model is shown on the next turn
+                return
 
-            # Save assistant response
-            db.save_message(user_id, "assistant", ai_response)
+            # Save the user, both messages and stats in one transaction
+            await db.arecord_turn(user_id, username, user_message, ai_response, {
+                "scope": scope,
+                "guild_id": guild_id,
+                "latency_ms": (time.time() - start_time) * 1000
+            })
 
-            # Send response (split if too long)
-            await self._send_response(message.channel, ai_response)
+        # Fold older turns into the summary off the reply's critical path
+        conversation_summarizer.schedule(user_id, scope)
 
     async def _send_response(self, channel, response: str):
         """Send response to Discord, splitting if necessary"""
@@ -173,6 +255,78 @@ class DiscordBot:
         else:
             await channel.send(response)
 
+    async def _send_streamed_response(
+        self, channel, chunks: AsyncIterator[str]
+    ) -> Optional[str]:
+        """
+        Render a streamed response into Discord messages as it arrives.
+
+        The first text is posted immediately, then the message is edited at
+        most every DISCORD_STREAM_EDIT_INTERVAL seconds; text beyond
+        DISCORD_MESSAGE_LIMIT continues in a new message.
+
+        Args:
+            channel: Channel to reply in
+            chunks: Response text pieces, e.g. from ``ai_client.stream_response``
+
+        Returns:
+            The full response text, or None if the response failed or was
+            empty (the error is shown in the channel)
+        """
+        limit = settings.DISCORD_MESSAGE_LIMIT
+        parts = []
+        failed = False
+        current = ""  # text of the Discord message being written
+        sent = None   # that message, once posted
+        shown = ""    # text it currently displays
+        last_edit = 0.0
+
+        async def show(text: str):
+            nonlocal sent, shown, last_edit
+            if sent is None:
+                sent = await channel.send(text)
+            elif text != shown:
+                await sent.edit(content=text)
+            shown, last_edit = text, time.monotonic()
+
+        async def safe_chunks():
+            nonlocal failed
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            except AIClientError as e:
+                # Show the error in place of (or after) the partial reply
+                failed = True
+                yield f"\n\n{e}" if parts else str(e)
+
+        async for chunk in safe_chunks():
+            parts.append(chunk)
+            current += chunk
+
+            # Finish full messages and continue in a new one
+            while len(current) > limit:
+                await show(current[:limit])
+                current = current[limit:]
+                sent, shown = None, ""
+
+            edit_due = (
+                time.monotonic() - last_edit >= settings.DISCORD_STREAM_EDIT_INTERVAL
+            )
+            if current.strip() and (sent is None or edit_due):
+                await show(current)
+
+        if current.strip():
+            await show(current)
+
+        if failed:
+            return None
+        response = "".join(parts)
+        if not response.strip():
+            # Nothing was shown, and an empty turn is not worth recording
+            await channel.send(EMPTY_RESPONSE_MESSAGE)
+            return None
+        return response
+
     def run(self, token: str = None):
         """Run the Discord bot"""
         token = token or settings.DISCORD_TOKEN
@@ -193,3 +347,7 @@ class DiscordBot:
                 print("Get help from https://stackoverflow.com/questions/66724687/")
             else:
                 raise e
+        finally:
+            # Drain pending database work and release connections
+            db.close()
+            response_cache.close()
@@ -6,6 +6,7 @@ from typing import Optional
 import discord
 
 from ..database.sqlite_db import db
+from .scope import conversation_scope
 # from ..rag.vector_store import vector_store  # Temporarily disabled
 
 
@@ -43,7 +44,7 @@ O bot usa RAG para melhorar as respostas com informações da base de conhecimen
     async def handle_clear_history(message: discord.Message):
         """Handle !limpar command"""
         user_id = str(message.author.id)
-        db.clear_user_history(user_id)
+        await db.aclear_user_history(user_id, conversation_scope(message))
         await message.channel.send(
             "✅ Seu histórico de conversas foi limpo! Vamos começar uma nova conversa."
         )
@@ -52,7 +53,7 @@ O bot usa RAG para melhorar as respostas com informações da base de conhecimen
     async def handle_stats(message: discord.Message):
         """Handle !stats command"""
         user_id = str(message.author.id)
-        stats = db.get_user_stats(user_id)
+        stats = await db.aget_user_stats(user_id)
 
         if stats:
             response = f"📊 **Suas Estatísticas:**\n"
@@ -66,7 +67,7 @@ O bot usa RAG para melhorar as respostas com informações da base de conhecimen
     @staticmethod
     async def handle_global_stats(message: discord.Message):
         """Handle !stats_global command"""
-        stats = db.get_total_stats()
+        stats = await db.aget_total_stats()
         response = f"📊 **Estatísticas Globais do Bot:**\n"
         response += f"👥 Total de usuários: {stats['total_users']}\n"
         response += f"💬 Total de mensagens: {stats['total_messages']}\n"
@@ -0,0 +1,200 @@
+"""
+Fitting prompts into the model's context window before they are sent.
+"""
+from typing import Dict, List, NamedTuple, Optional
+
+from ..config.settings import settings
+from ..utils.tokens import (
+    MESSAGE_TOKEN_OVERHEAD,
+    estimate_message_tokens,
+    estimate_messages_tokens,
+    estimate_tokens,
+    truncate_to_tokens,
+)
+
+# RAG context or a summary cut below this many tokens is dropped instead
+MIN_SECTION_TOKENS = 32
+
+
+class FittedPrompt(NamedTuple):
+    """Messages ready to send, and what had to be trimmed to fit them"""
+
+    messages: List[Dict[str, str]]
+    tokens: int
+    # Part -> amount removed: "history" in messages, the others in tokens
+    trimmed: Dict[str, int]
+
+
+class ContextWindow:
+    """
+    Token budget of a prompt for a set of models.
+
+    The budget is the smallest context window among the models (any of
+    them may serve the request) minus ``AI_COMPLETION_RESERVE_TOKENS`` for
+    the answer, and never more than ``AI_PROMPT_TOKEN_BUDGET`` when set.
+    """
+
+    def __init__(self, models: List[str]):
+        self.window = min(settings.get_context_window(model) for model in models)
+        budget = self.window - settings.AI_COMPLETION_RESERVE_TOKENS
+        if settings.AI_PROMPT_TOKEN_BUDGET > 0:
+            budget = min(budget, settings.AI_PROMPT_TOKEN_BUDGET)
+        self.budget = budget
+
+    def fit(
+        self,
+        user_message: str,
+        conversation_history: List[Dict] = None,
+        rag_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> FittedPrompt:
+        """
+        Build the messages array, trimmed to the token budget.
+
+        Parts are given up in order of priority: the oldest history
+        messages first, then the RAG context, then the conversation
+        summary, and the user's message only as a last resort.
+
+        Args:
+            user_message: The user's current message
+            conversation_history: Previous messages, oldest first
+            rag_context: Optional context from RAG search
+            conversation_summary: Optional summary of older conversation turns
+
+        Returns:
+            The fitted prompt
+
+        Raises:
+            ValueError: If not even the system prompt fits the budget
+        """
+        history = list(conversation_history or [])
+        trimmed = {"history": 0, "rag_context": 0, "summary": 0, "user_message": 0}
+
+        def system_tokens() -> int:
+            return estimate_message_tokens(
+                settings.get_system_prompt(rag_context, conversation_summary)
+            )
+
+        fixed = system_tokens() + estimate_message_tokens(user_message)
+        history_tokens = estimate_messages_tokens(history)
+
+        # 1. Oldest history messages
+        while history and fixed + history_tokens > self.budget:
+            history_tokens -= estimate_message_tokens(history.pop(0)["content"])
+            trimmed["history"] += 1
+
+        # 2. RAG context, then 3. the summary
+        for part in ("rag_context", "summary"):
+            text = rag_context if part == "rag_context" else conversation_summary
+            excess = fixed + history_tokens - self.budget
+            if excess <= 0 or not text:
+                continue
+
+            before = system_tokens()
+            # One token of slack for rounding in the concatenated prompt
+            keep = estimate_tokens(text) - excess - 1
+            if keep >= MIN_SECTION_TOKENS:
+                text = truncate_to_tokens(text, keep)
+            else:
+                text = None
+            if part == "rag_context":
+                rag_context = text
+            else:
+                conversation_summary = text
+
+            after = system_tokens()
+            trimmed[part] = before - after
+            fixed -= before - after
+
+        # 4. The user's message (the history is empty by now)
+        excess = fixed + history_tokens - self.budget
+        if excess > 0:
+            available = self.budget - system_tokens() - MESSAGE_TOKEN_OVERHEAD
+            if available <= 0:
+                raise ValueError(
+                    "System prompt does not fit the context budget of "
+                    f"{self.budget} tokens"
+                )
+            shortened = truncate_to_tokens(user_message, available)
+            original = estimate_message_tokens(user_message)
+            trimmed["user_message"] = original - estimate_message_tokens(shortened)
+            user_message = shortened
+
+        system_message = settings.get_system_prompt(rag_context, conversation_summary)
+        messages = [{"role": "system", "content": system_message}]
+        messages.extend(history)
+        messages.append({"role": "user", "content": user_message})
+
+        return FittedPrompt(messages, estimate_messages_tokens(messages), trimmed)
+
+    def fit_summary(
+        self,
+        messages: List[Dict[str, str]],
+        previous_summary: Optional[str] = None
+    ) -> FittedPrompt:
+        """
+        Build the summarization request, trimmed to the token budget.
+
+        Unlike a chat prompt, the newest turns are given up first: they are
+        summarized on the next run, while skipped old ones never would be.
+        Then the previous summary is shortened, and a single turn too long
+        for the budget is cut.
+
+        Args:
+            messages: Turns to summarize, in chronological order
+            previous_summary: Existing summary to extend with these turns
+
+        Returns:
+            The fitted prompt; ``trimmed["history"]`` is the number of the
+            newest turns left out
+
+        Raises:
+            ValueError: If not even the summary instructions fit the budget
+        """
+        turns = [f"{m['role']}: {m['content']}" for m in messages]
+        trimmed = {"history": 0, "summary": 0, "user_message": 0}
+
+        def build() -> List[Dict[str, str]]:
+            prompt = ""
+            if previous_summary:
+                prompt += f"Resumo atual:\n{previous_summary}\n\n"
+            prompt += "Novas mensagens:\n" + "\n".join(turns)
+            return [
+                {"role": "system", "content": settings.SUMMARY_PROMPT},
+                {"role": "user", "content": prompt}
+            ]
+
+        def excess() -> int:
+            return estimate_messages_tokens(build()) - self.budget
+
+        # 1. Newest turns, keeping at least one
+        while len(turns) > 1 and excess() > 0:
+            turns.pop()
+            trimmed["history"] += 1
+
+        # 2. The previous summary
+        over = excess()
+        if over > 0 and previous_summary:
+            before = estimate_tokens(previous_summary)
+            keep = before - over - 1
+            if keep >= MIN_SECTION_TOKENS:
+                previous_summary = truncate_to_tokens(previous_summary, keep)
+                trimmed["summary"] = before - estimate_tokens(previous_summary)
+            else:
+                previous_summary = None
+                trimmed["summary"] = before
+
+        # 3. The remaining turn
+        over = excess()
+        if over > 0 and turns:
+            keep = estimate_tokens(turns[0]) - over - 1
+            if keep <= 0:
+                raise ValueError(
+                    "Summary prompt does not fit the context budget "
+                    f"of {self.budget} tokens"
+                )
+            trimmed["user_message"] = estimate_tokens(turns[0]) - keep
+            turns[0] = truncate_to_tokens(turns[0], keep)
+
+        fitted = build()
+        return FittedPrompt(fitted, estimate_messages_tokens(fitted), trimmed)
@@ -0,0 +1,238 @@
+"""
+Latency-aware routing of AI requests over a pool of models.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from ..config.settings import settings
+
+T = TypeVar("T")
+
+# Samples needed before a model's latency and error rate affect its rank
+MIN_SAMPLES = 5
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of a list of values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class ModelStats:
+    """Rolling latency and outcome samples of one model"""
+
+    def __init__(self, window: int, max_age: float):
+        self.max_age = max_age
+        # (finished_at, latency_ms, ok)
+        self._samples: Deque[Tuple[float, float, bool]] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+
+    def record(self, latency_ms: float, ok: bool):
+        """Add the outcome of a finished request"""
+        with self._lock:
+            self._samples.append((time.monotonic(), latency_ms, ok))
+            self.requests += 1
+            if not ok:
+                self.failures += 1
+
+    def snapshot(self) -> Dict:
+        """Get p50/p95 latency (successful requests) and error rate"""
+        with self._lock:
+            # Old samples expire so a model that failed for a while gets retried
+            cutoff = time.monotonic() - self.max_age
+            while self._samples and self._samples[0][0] < cutoff:
+                self._samples.popleft()
+            samples = list(self._samples)
+
+        latencies = [latency for _, latency, ok in samples if ok]
+        errors = sum(1 for _, _, ok in samples if not ok)
+        p50 = percentile(latencies, 50)
+        p95 = percentile(latencies, 95)
+        return {
+            "samples": len(samples),
+            "p50_ms": round(p50, 1) if p50 is not None else None,
+            "p95_ms": round(p95, 1) if p95 is not None else None,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "requests": self.requests,
+            "failures": self.failures
+        }
+
+
+class ModelRouter:
+    """
+    Routes each request to the fastest healthy model of an ordered pool.
+
+    Models are ranked healthy first (error rate below
+    ``MODEL_MAX_ERROR_RATE``), then by rolling p95 latency, then by their
+    position in the pool. A model with fewer than ``MIN_SAMPLES`` recent
+    samples is ranked as if it were fastest, so every model gets measured.
+
+    A failed request fails over to the next model. With hedging enabled,
+    if the first model has not answered after ``AI_HEDGE_DELAY_MS``, the
+    next one is asked too; the first answer wins and the other request is
+    cancelled.
+    """
+
+    def __init__(
+        self,
+        models: List[str],
+        hedge_delay_ms: float = None,
+        window: int = None,
+        max_error_rate: float = None,
+        max_age: float = None
+    ):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = list(dict.fromkeys(models))
+        self.hedge_delay_ms = (
+            settings.AI_HEDGE_DELAY_MS if hedge_delay_ms is None else hedge_delay_ms
+        )
+        self.max_error_rate = (
+            settings.MODEL_MAX_ERROR_RATE if max_error_rate is None else max_error_rate
+        )
+        window = window or settings.MODEL_STATS_WINDOW
+        max_age = settings.MODEL_STATS_MAX_AGE if max_age is None else max_age
+        self._stats = {model: ModelStats(window, max_age) for model in self.models}
+
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+
+    def ranked(self) -> List[str]:
+        """Get the models in the order they should be tried"""
+        snapshots = {model: self._stats[model].snapshot() for model in self.models}
+
+        def rank(indexed: Tuple[int, str]):
+            index, model = indexed
+            stats = snapshots[model]
+            if stats["samples"] < MIN_SAMPLES:
+                return (False, 0.0, index)
+            unhealthy = stats["error_rate"] >= self.max_error_rate
+            return (unhealthy, stats["p95_ms"] or 0.0, index)
+
+        return [model for _, model in sorted(enumerate(self.models), key=rank)]
+
+    async def run(
+        self,
+        call: Callable[[str], Awaitable[T]],
+        hedge: bool = True,
+        deadline: Optional[float] = None
+    ) -> T:
+        """
+        Run a request against the pool.
+
+        Args:
+            call: Makes the request with the given model
+            hedge: Allow a hedged second request; disable for calls whose
+                result must not be discarded (e.g. an opened stream)
+            deadline: Event loop time after which no failover or hedge is
+                started; the calls themselves must also respect it
+
+        Returns:
+            Result of the first model to succeed
+
+        Raises:
+            Exception: The last model's error, if every model failed
+        """
+        # Imported here: ai_client imports this module
+        from .ai_client import AIClientError
+
+        loop = asyncio.get_running_loop()
+        remaining = self.ranked()
+        hedge_delay = None
+        if hedge and self.hedge_delay_ms > 0:
+            hedge_delay = self.hedge_delay_ms / 1000
+        pending: Dict[asyncio.Task, Tuple[str, float]] = {}
+        hedge_task: Optional[asyncio.Task] = None
+        # Requests allowed in flight: two once a hedge was sent
+        in_flight = 1
+        last_error: Optional[Exception] = None
+
+        def expired() -> bool:
+            return deadline is not None and loop.time() >= deadline
+
+        def launch() -> asyncio.Task:
+            model = remaining.pop(0)
+            task = asyncio.ensure_future(call(model))
+            pending[task] = (model, time.perf_counter())
+            return task
+
+        launch()
+        try:
+            while pending:
+                # Hedge a single outstanding request, and only once
+                can_hedge = (
+                    hedge_delay is not None
+                    and remaining
+                    and in_flight == 1
+                    and not expired()
+                )
+                timeout = hedge_delay if can_hedge else None
+                if can_hedge and deadline is not None:
+                    timeout = min(timeout, deadline - loop.time())
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=timeout,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    if expired():
+                        # Too late to hedge; the request in flight times out itself
+                        continue
+                    self.hedges += 1
+                    in_flight = 2
+                    hedge_task = launch()
+                    continue
+
+                for task in done:
+                    model, started = pending.pop(task)
+                    latency_ms = (time.perf_counter() - started) * 1000
+                    try:
+                        result = task.result()
+                    except AIClientError as e:
+                        self._stats[model].record(latency_ms, ok=False)
+                        last_error = e
+                        continue
+
+                    self._stats[model].record(latency_ms, ok=True)
+                    if task is hedge_task:
+                        self.hedge_wins += 1
+                    # The loser took at least this long; without a sample it
+                    # would keep its old rank however slow it has become
+                    for loser, (loser_model, loser_started) in pending.items():
+                        if not loser.done():
+                            self._stats[loser_model].record(
+                                (time.perf_counter() - loser_started) * 1000, ok=True
+                            )
+                    return result
+
+                # Replace failed requests with the next models, while there is time
+                while remaining and len(pending) < in_flight and not expired():
+                    self.failovers += 1
+                    task = launch()
+                    if in_flight == 2:
+                        hedge_task = task
+        finally:
+            # The losing hedge, or everything if the caller was cancelled
+            for task in pending:
+                task.cancel()
+
+        raise last_error
+
+    def snapshot(self) -> Dict:
+        """Get per-model latency and error stats and hedging counters"""
+        return {
+            "models": {model: self._stats[model].snapshot() for model in self.models},
+            "ranking": self.ranked(),
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers
+        }
@@ -0,0 +1,264 @@
+"""
+Cache of AI responses for repeated prompts.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ..config.settings import settings
+
+# Extra bytes counted per entry for the key and bookkeeping
+ENTRY_OVERHEAD = 160
+
+# Disk tier: expired and excess rows are pruned once every this many writes
+PRUNE_EVERY = 100
+
+
+def normalize_message(text: str) -> str:
+    """Normalize a user message so trivially different spellings share a key"""
+    return " ".join(text.split()).casefold()
+
+
+def response_cache_key(model: str, messages: List[Dict[str, str]]) -> str:
+    """
+    Hash everything that determines a response.
+
+    The system message already carries the RAG context and conversation
+    summary, so the key covers the model, system prompt, context, history
+    and the (normalized) user message.
+
+    Args:
+        model: Model the request is sent to
+        messages: Full messages array, ending with the user message
+
+    Returns:
+        Hex SHA-256 digest
+    """
+    *context, last = messages
+    payload = {
+        "model": model,
+        "messages": [[m["role"], m["content"]] for m in context],
+        "message": normalize_message(last["content"])
+    }
+    encoded = json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier TTL cache of AI responses.
+
+    The memory tier is an LRU bounded by entry count and total bytes. The
+    optional SQLite tier (``RESPONSE_CACHE_DB_PATH``) survives restarts and
+    holds more entries; its hits are promoted to memory. Only successful
+    responses should be stored.
+    """
+
+    def __init__(
+        self,
+        ttl: float = None,
+        max_entries: int = None,
+        max_bytes: int = None,
+        db_path: str = None,
+        db_max_entries: int = None
+    ):
+        if ttl is None:
+            ttl = settings.RESPONSE_CACHE_TTL_SECONDS
+        if max_entries is None:
+            max_entries = settings.RESPONSE_CACHE_MAX_ENTRIES
+        if max_bytes is None:
+            max_bytes = settings.RESPONSE_CACHE_MAX_BYTES
+        if db_path is None:
+            db_path = settings.RESPONSE_CACHE_DB_PATH
+        if db_max_entries is None:
+            db_max_entries = settings.RESPONSE_CACHE_DB_MAX_ENTRIES
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+        self.db_max_entries = db_max_entries
+
+        # key -> (expires_at, response)
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._db_writes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Get a cached response, checking memory then disk, or None on a miss"""
+        response = self._memory_get(key)
+        if response is None and self.db_path:
+            row = await asyncio.to_thread(self._disk_get, key)
+            if row is not None:
+                expires_at, response = row
+                self._memory_set(key, response, expires_at)
+                with self._lock:
+                    self.disk_hits += 1
+
+        with self._lock:
+            if response is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return response
+
+    async def aset(self, key: str, response: str):
+        """Store a response in both tiers"""
+        expires_at = time.time() + self.ttl
+        self._memory_set(key, response, expires_at)
+        if self.db_path:
+            await asyncio.to_thread(self._disk_set, key, response, expires_at)
+
+    def clear(self):
+        """Forget every cached response, in memory and on disk"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.db_path:
+            with self._db_lock:
+                conn = self._get_connection()
+                conn.execute("DELETE FROM response_cache")
+                conn.commit()
+
+    def stats(self) -> Dict:
+        """Get cache size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def close(self):
+        """Close the disk tier connection"""
+        with self._db_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _memory_get(self, key: str) -> Optional[str]:
+        """Look a key up in the memory tier, dropping it if expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return response
+
+    def _memory_set(self, key: str, response: str, expires_at: float):
+        """Insert or replace a memory entry, then evict down to the bounds"""
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires_at, response)
+            self._bytes += _entry_size(response)
+
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: str):
+        """Drop a memory entry; callers must hold the lock"""
+        _, response = self._entries.pop(key)
+        self._bytes -= _entry_size(response)
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Open the disk tier, creating its table on first use"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.db_path,
+                timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+                check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                ) WITHOUT ROWID
+            """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_response_cache_last_used
+                ON response_cache (last_used)
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        """Look a key up in the disk tier"""
+        now = time.time()
+        with self._db_lock:
+            conn = self._get_connection()
+            row = conn.execute(
+                """
+                SELECT expires_at, response FROM response_cache
+                WHERE key = ? AND expires_at > ?
+                """,
+                (key, now)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE response_cache SET last_used = ? WHERE key = ?", (now, key)
+                )
+                conn.commit()
+            return row
+
+    def _disk_set(self, key: str, response: str, expires_at: float):
+        """Write a response to the disk tier, pruning it now and then"""
+        now = time.time()
+        with self._db_lock:
+            conn = self._get_connection()
+            conn.execute("""
+                INSERT OR REPLACE INTO response_cache
+                    (key, response, expires_at, last_used)
+                VALUES (?, ?, ?, ?)
+            """, (key, response, expires_at, now))
+
+            self._db_writes += 1
+            if self._db_writes % PRUNE_EVERY == 0:
+                conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+                # Least recently used rows beyond the size limit
+                conn.execute("""
+                    DELETE FROM response_cache WHERE key IN (
+                        SELECT key FROM response_cache
+                        ORDER BY last_used DESC
+                        LIMIT -1 OFFSET ?
+                    )
+                """, (self.db_max_entries,))
+            conn.commit()
+
+
+def _entry_size(response: str) -> int:
+    """Approximate memory footprint of a cached response in bytes"""
+    return len(response.encode("utf-8")) + ENTRY_OVERHEAD
+
+
+# Singleton instance
+response_cache = ResponseCache()
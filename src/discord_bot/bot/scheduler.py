@@ -0,0 +1,208 @@
+"""
+Fair-share scheduling of AI requests under a global concurrency limit.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict, Optional
+
+from ..config.settings import settings
+from .model_router import percentile
+
+# Fair-share group of direct messages (they have no guild)
+DIRECT_GROUP = "dm"
+
+# Fair-share group of background conversation summaries
+SUMMARY_GROUP = "summaries"
+
+# Wait-time samples kept for the percentiles
+WAIT_SAMPLES = 1000
+
+
+class _Queue:
+    """Waiters of one user or group, with its deficit round robin credit"""
+
+    __slots__ = ("deficit", "waiters", "children")
+
+    def __init__(self):
+        self.deficit = 0.0
+        self.waiters: Deque[asyncio.Future] = deque()
+        # Per-user queues of a group, in round robin order
+        self.children: "OrderedDict[str, _Queue]" = OrderedDict()
+
+
+class RequestScheduler:
+    """
+    Admits AI requests fairly across guilds and users.
+
+    At most ``AI_MAX_CONCURRENT_REQUESTS`` requests run at once. When
+    the limit is reached, requests queue and free slots are handed out by
+    deficit round robin at two levels: first between groups (guilds, DMs,
+    background summaries), then between the users of the chosen group. A
+    spamming user only delays their own requests, and a raid in one guild
+    only uses that guild's share. Weights from ``AI_SCHEDULER_GROUP_WEIGHTS``
+    and ``AI_SCHEDULER_USER_WEIGHTS`` give a group or user a bigger share.
+
+    Requests are admitted on the event loop; the queues are guarded by a
+    lock so ``snapshot`` can be read from other threads (the dashboard).
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = None,
+        group_weights: Dict[str, int] = None,
+        user_weights: Dict[str, int] = None
+    ):
+        self.max_concurrent = max_concurrent or settings.AI_MAX_CONCURRENT_REQUESTS
+        if group_weights is None:
+            group_weights = settings.AI_SCHEDULER_GROUP_WEIGHTS
+        if user_weights is None:
+            user_weights = settings.AI_SCHEDULER_USER_WEIGHTS
+        self.group_weights = group_weights
+        self.user_weights = user_weights
+
+        self._groups: "OrderedDict[str, _Queue]" = OrderedDict()
+        self._in_flight = 0
+        self._queued = 0
+        self._lock = threading.Lock()
+
+        self.granted = 0
+        self.queued_total = 0
+        self.peak_queue_depth = 0
+        self._waits_ms: Deque[float] = deque(maxlen=WAIT_SAMPLES)
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        user_id: str,
+        group: Optional[str] = None
+    ) -> AsyncIterator[None]:
+        """
+        Hold one of the concurrent request slots.
+
+        Args:
+            user_id: User the request is made for
+            group: Fair-share group, normally the guild id; None means a
+                direct message
+        """
+        await self.acquire(user_id, group)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, user_id: str, group: Optional[str] = None):
+        """Wait for a slot; every acquire must be paired with a release"""
+        group = group or DIRECT_GROUP
+        waiter = asyncio.get_running_loop().create_future()
+        with self._lock:
+            if self._in_flight < self.max_concurrent and not self._queued:
+                self._in_flight += 1
+                self.granted += 1
+                self._waits_ms.append(0.0)
+                return
+
+            group_queue = self._groups.setdefault(group, _Queue())
+            group_queue.children.setdefault(user_id, _Queue()).waiters.append(waiter)
+            self._queued += 1
+            self.queued_total += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self._queued)
+
+        start = time.perf_counter()
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the caller was cancelled: pass the slot on
+                self.release()
+            else:
+                self._remove(group, user_id, waiter)
+            raise
+        with self._lock:
+            self._waits_ms.append((time.perf_counter() - start) * 1000)
+
+    def release(self):
+        """Free a slot and hand it to the next waiter in fair order"""
+        with self._lock:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def snapshot(self) -> Dict:
+        """Get concurrency, queue depth and wait-time metrics; thread-safe"""
+        with self._lock:
+            waits = list(self._waits_ms)
+            state = {
+                "max_concurrent": self.max_concurrent,
+                "in_flight": self._in_flight,
+                "queue_depth": self._queued,
+                "queue_depth_by_group": {
+                    group: sum(len(user.waiters) for user in queue.children.values())
+                    for group, queue in self._groups.items()
+                },
+                "peak_queue_depth": self.peak_queue_depth,
+                "granted": self.granted,
+                "queued_total": self.queued_total
+            }
+
+        p50 = percentile(waits, 50)
+        p95 = percentile(waits, 95)
+        return {
+            **state,
+            "wait_p50_ms": round(p50, 1) if p50 is not None else None,
+            "wait_p95_ms": round(p95, 1) if p95 is not None else None,
+            "wait_max_ms": round(max(waits), 1) if waits else None
+        }
+
+    def _dispatch(self):
+        """Grant free slots to waiters by deficit round robin; callers hold the lock"""
+        while self._in_flight < self.max_concurrent and self._queued:
+            group, group_queue = next(iter(self._groups.items()))
+            if group_queue.deficit < 1:
+                # Out of credit: top up and let the next group go first
+                group_queue.deficit += max(self.group_weights.get(group, 1), 1)
+                self._groups.move_to_end(group)
+                continue
+
+            user_id, user_queue = next(iter(group_queue.children.items()))
+            if user_queue.deficit < 1:
+                user_queue.deficit += max(self.user_weights.get(user_id, 1), 1)
+                group_queue.children.move_to_end(user_id)
+                continue
+
+            waiter = user_queue.waiters.popleft()
+            self._queued -= 1
+            self._prune(group, user_id)
+            if waiter.cancelled():
+                # Its caller is gone and has not cleaned up yet
+                continue
+
+            user_queue.deficit -= 1
+            group_queue.deficit -= 1
+
+            self._in_flight += 1
+            self.granted += 1
+            waiter.set_result(None)
+
+    def _remove(self, group: str, user_id: str, waiter: asyncio.Future):
+        """Drop a cancelled waiter from its queue"""
+        with self._lock:
+            group_queue = self._groups.get(group)
+            user_queue = group_queue.children.get(user_id) if group_queue else None
+            if user_queue is not None and waiter in user_queue.waiters:
+                user_queue.waiters.remove(waiter)
+                self._queued -= 1
+                self._prune(group, user_id)
+
+    def _prune(self, group: str, user_id: str):
+        """Forget emptied queues so idle users keep no credit; callers hold the lock"""
+        group_queue = self._groups[group]
+        if not group_queue.children[user_id].waiters:
+            del group_queue.children[user_id]
+        if not group_queue.children:
+            del self._groups[group]
+
+
+# Singleton instance
+ai_scheduler = RequestScheduler()
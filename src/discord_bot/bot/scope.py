@@ -0,0 +1,27 @@
+"""
+Conversation scoping for Discord messages.
+"""
+import discord
+
+from ..config.settings import settings
+
+
+def conversation_scope(message: discord.Message) -> str:
+    """
+    Get the conversation scope a message belongs to.
+
+    DMs always form their own conversation; guild messages share one
+    conversation per guild, or one per channel when CONVERSATION_SCOPE
+    is "channel".
+
+    Args:
+        message: Incoming Discord message
+
+    Returns:
+        Scope key such as "dm", "guild:<id>" or "channel:<id>"
+    """
+    if isinstance(message.channel, discord.DMChannel):
+        return "dm"
+    if settings.CONVERSATION_SCOPE == "channel" or message.guild is None:
+        return f"channel:{message.channel.id}"
+    return f"guild:{message.guild.id}"
@@ -0,0 +1,94 @@
+"""
+Coalescing of identical concurrent requests into a single upstream call.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    """One shared upstream call and the number of callers awaiting it"""
+
+    __slots__ = ("task", "waiters", "abandoned")
+
+    def __init__(self, task: "asyncio.Task[T]"):
+        self.task = task
+        self.waiters = 0
+        # Set when every caller left and the upstream call was cancelled
+        self.abandoned = False
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time and shares its outcome.
+
+    The first caller for a key starts the call as a separate task; callers
+    arriving while it runs await the same task instead of starting their
+    own. Every caller gets the result or the exception.
+
+    Cancellation:
+    - A cancelled caller stops waiting without affecting the others.
+    - When the last caller is gone, the upstream call is cancelled, since
+      nobody needs its result anymore.
+    - If the shared call is cancelled from outside while callers still
+      wait, they start a new shared call instead of failing.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def run(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn, or join the identical call already in flight.
+
+        Args:
+            key: Identity of the request; equal keys must mean equal results
+            fn: Makes the upstream call
+
+        Returns:
+            Result of the shared call
+        """
+        call = self._calls.get(key)
+        if call is None or call.abandoned or call.task.done():
+            call = _Call(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            # Unlike awaiting the task, wait() neither cancels it when this
+            # caller is cancelled nor raises when the task is cancelled
+            await asyncio.wait({call.task})
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.abandoned = True
+                self.abandoned += 1
+                call.task.cancel()
+
+        if call.task.cancelled():
+            # The shared call was cancelled under us: start over, sharing
+            # the new call with the other callers that were waiting
+            return await self.run(key, fn)
+        return call.task.result()
+
+    def stats(self) -> Dict:
+        """Get call counters and the number of calls in flight"""
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned
+        }
+
+    def _forget(self, key: Hashable, call: _Call):
+        """Remove a finished call, unless a newer one took its key"""
+        if self._calls.get(key) is call:
+            del self._calls[key]
@@ -0,0 +1,77 @@
+"""
+Background summarizer that condenses older conversation turns.
+"""
+import asyncio
+import time
+from typing import Dict, Tuple
+
+from ..config.settings import settings
+from ..database.sqlite_db import db
+from ..utils.logging_config import logger as bot_logger
+from .ai_client import ai_client
+from .scheduler import SUMMARY_GROUP, ai_scheduler
+
+
+class ConversationSummarizer:
+    """
+    Keeps a rolling summary of each conversation's turns older than the recent window.
+
+    Summaries are refreshed incrementally in background tasks scheduled
+    after a reply has been sent, so they never delay a response.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Tuple[str, str], asyncio.Task] = {}
+
+    def schedule(self, user_id: str, scope: str = ""):
+        """Refresh a conversation's summary in the background if it has fallen behind"""
+        if not settings.SUMMARY_ENABLED:
+            return
+
+        key = (user_id, scope)
+        task = self._tasks.get(key)
+        if task is not None and not task.done():
+            return
+
+        task = asyncio.create_task(self._refresh(user_id, scope))
+        self._tasks[key] = task
+        task.add_done_callback(lambda _: self._tasks.pop(key, None))
+
+    async def _refresh(self, user_id: str, scope: str):
+        """Fold unsummarized older messages into the conversation's summary"""
+        start_time = time.time()
+        try:
+            current = await db.aget_conversation_summary(user_id, scope)
+            after_id = current["last_message_id"] if current else 0
+
+            messages = await db.aget_messages_to_summarize(
+                user_id, after_id, scope=scope
+            )
+            if len(messages) < settings.SUMMARY_TRIGGER_MESSAGES:
+                return
+
+            # Summaries share one group, so they cannot crowd out replies
+            async with ai_scheduler.slot(user_id, SUMMARY_GROUP):
+                summary, covered = await ai_client.summarize(
+                    messages,
+                    current["summary"] if current else None
+                )
+            # Turns that did not fit the context window are summarized next time
+            await db.asave_conversation_summary(
+                user_id, summary, messages[covered - 1]["id"], scope
+            )
+
+            bot_logger.log_bot_event("conversation_summarized",
+                                     user_id=user_id,
+                                     scope=scope,
+                                     messages=len(messages))
+            bot_logger.log_performance(
+                "conversation_summary", (time.time() - start_time) * 1000
+            )
+        except Exception as e:
+            bot_logger.get_logger().warning(
+                f"Failed to summarize conversation for {user_id}: {e}"
+            )
+
+
+conversation_summarizer = ConversationSummarizer()
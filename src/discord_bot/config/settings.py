@@ -3,7 +3,27 @@ Configuration settings for Discord Bot.
 Loads environment variables and provides centralized configuration.
 """
 import os
-from typing import Optional
+from typing import Dict, FrozenSet, List, Optional
+
+
+def _parse_int_map(value: str) -> Dict[str, int]:
+    """Parse "key=number,key2=number" into a dict"""
+    result = {}
+    for item in value.split(","):
+        if "=" in item:
+            key, number = item.rsplit("=", 1)
+            result[key.strip()] = int(number)
+    return result
+
+
+def _parse_list(value: str) -> List[str]:
+    """Parse "a,b,c" into a list of stripped, non-empty items"""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _parse_set(value: str) -> FrozenSet[str]:
+    """Parse "a,b,c" into a set of stripped, non-empty items"""
+    return frozenset(_parse_list(value))
 
 
 class Settings:
@@ -16,6 +36,57 @@ class Settings:
     OPENROUTER_API_KEY: str = os.getenv("OPENROUTER_API_KEY", "")
     OPENROUTER_BASE_URL: str = "https://openrouter.ai/api/v1/chat/completions"
     OPENROUTER_MODEL: str = os.getenv("OPENROUTER_MODEL", "meta-llama/llama-3.1-8b-instruct:free")
+    # Ordered pool of models to route between, e.g. "model-a,model-b"
+    # (empty = OPENROUTER_MODEL only)
+    OPENROUTER_MODELS: List[str] = _parse_list(os.getenv("OPENROUTER_MODELS", ""))
+
+    # Model routing: rolling latency/error stats, failover and hedged requests
+    # Ask the next model too if the first has not answered after this long
+    # (0 = no hedging)
+    AI_HEDGE_DELAY_MS: float = float(os.getenv("AI_HEDGE_DELAY_MS", "0"))
+    MODEL_STATS_WINDOW: int = int(os.getenv("MODEL_STATS_WINDOW", "100"))
+    MODEL_STATS_MAX_AGE: float = float(os.getenv("MODEL_STATS_MAX_AGE", "600"))
+    MODEL_MAX_ERROR_RATE: float = float(os.getenv("MODEL_MAX_ERROR_RATE", "0.5"))
+
+    # Pooled HTTP connections to OpenRouter, reused across requests
+    AI_HTTP_POOL_SIZE: int = int(os.getenv("AI_HTTP_POOL_SIZE", "100"))
+    AI_HTTP_POOL_SIZE_PER_HOST: int = int(os.getenv("AI_HTTP_POOL_SIZE_PER_HOST", "20"))
+    AI_HTTP_DNS_CACHE_TTL: int = int(os.getenv("AI_HTTP_DNS_CACHE_TTL", "300"))
+    AI_HTTP_KEEPALIVE_TIMEOUT: float = float(
+        os.getenv("AI_HTTP_KEEPALIVE_TIMEOUT", "60")
+    )
+
+    # Retries of throttled (429), failed (5xx) or dropped requests to OpenRouter
+    AI_MAX_RETRIES: int = int(os.getenv("AI_MAX_RETRIES", "3"))
+    AI_RETRY_BASE_DELAY: float = float(os.getenv("AI_RETRY_BASE_DELAY", "0.5"))
+    AI_RETRY_MAX_DELAY: float = float(os.getenv("AI_RETRY_MAX_DELAY", "10"))
+    AI_REQUEST_DEADLINE: float = float(os.getenv("AI_REQUEST_DEADLINE", "60"))
+
+    # Identical concurrent requests share a single upstream call
+    AI_COALESCE_REQUESTS: bool = (
+        os.getenv("AI_COALESCE_REQUESTS", "true").lower() == "true"
+    )
+
+    # Fair-share scheduling of AI requests
+    AI_MAX_CONCURRENT_REQUESTS: int = int(os.getenv("AI_MAX_CONCURRENT_REQUESTS", "8"))
+    # Bigger shares for some guilds (by id; "dm" and "summaries" are groups
+    # too), e.g. "123=3,summaries=1"
+    AI_SCHEDULER_GROUP_WEIGHTS: Dict[str, int] = _parse_int_map(
+        os.getenv("AI_SCHEDULER_GROUP_WEIGHTS", "")
+    )
+    AI_SCHEDULER_USER_WEIGHTS: Dict[str, int] = _parse_int_map(
+        os.getenv("AI_SCHEDULER_USER_WEIGHTS", "")
+    )
+
+    # Circuit breakers for OpenRouter and OpenAI: fail fast while they are down
+    # Open when this share of recent calls failed (with at least
+    # CIRCUIT_MIN_CALLS calls)
+    CIRCUIT_FAILURE_RATE: float = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+    CIRCUIT_MIN_CALLS: int = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+    CIRCUIT_WINDOW_SECONDS: float = float(os.getenv("CIRCUIT_WINDOW_SECONDS", "60"))
+    # Seconds to stay open before letting probe requests through
+    CIRCUIT_OPEN_SECONDS: float = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+    CIRCUIT_HALF_OPEN_PROBES: int = int(os.getenv("CIRCUIT_HALF_OPEN_PROBES", "1"))
 
     # OpenAI Configuration (for embeddings)
     OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
@@ -26,10 +97,121 @@ class Settings:
     CHROMA_DB_PATH: str = os.getenv("CHROMA_DB_PATH", "./chroma_db")
     CHROMA_COLLECTION_NAME: str = os.getenv("CHROMA_COLLECTION_NAME", "rag_collection")
 
+    # SQLite Tuning
+    SQLITE_BUSY_TIMEOUT_MS: int = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+    SQLITE_CACHE_SIZE_KB: int = int(os.getenv("SQLITE_CACHE_SIZE_KB", "16384"))
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_STATEMENT_CACHE_SIZE: int = int(
+        os.getenv("SQLITE_STATEMENT_CACHE_SIZE", "256")
+    )
+    # Connections available to the read-only handle used by the admin dashboard
+    SQLITE_READONLY_POOL_SIZE: int = int(os.getenv("SQLITE_READONLY_POOL_SIZE", "4"))
+    SQLITE_EXECUTOR_QUEUE_SIZE: int = int(
+        os.getenv("SQLITE_EXECUTOR_QUEUE_SIZE", "1000")
+    )
+    SQLITE_WRITE_BEHIND: bool = (
+        os.getenv("SQLITE_WRITE_BEHIND", "false").lower() == "true"
+    )
+    SQLITE_WRITE_BEHIND_INTERVAL_MS: int = int(
+        os.getenv("SQLITE_WRITE_BEHIND_INTERVAL_MS", "50")
+    )
+    SQLITE_WRITE_BEHIND_BATCH_SIZE: int = int(
+        os.getenv("SQLITE_WRITE_BEHIND_BATCH_SIZE", "200")
+    )
+    # Failed commits of a batch before its messages are written one by one
+    # and the ones that still fail are dropped
+    SQLITE_WRITE_BEHIND_MAX_ATTEMPTS: int = int(
+        os.getenv("SQLITE_WRITE_BEHIND_MAX_ATTEMPTS", "5")
+    )
+    # Unwritten messages at which enqueueing blocks until the flusher catches up
+    SQLITE_WRITE_BEHIND_MAX_PENDING: int = int(
+        os.getenv("SQLITE_WRITE_BEHIND_MAX_PENDING", "10000")
+    )
+
+    # Conversation History Cache
+    HISTORY_CACHE_MAX_USERS: int = int(os.getenv("HISTORY_CACHE_MAX_USERS", "10000"))
+    HISTORY_CACHE_MAX_BYTES: int = int(
+        os.getenv("HISTORY_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+    )
+    HISTORY_CACHE_WINDOW: int = int(os.getenv("HISTORY_CACHE_WINDOW", "50"))
+
+    # Message Retention (0 disables a rule)
+    MESSAGE_RETENTION_DAYS: int = int(os.getenv("MESSAGE_RETENTION_DAYS", "0"))
+    MESSAGE_RETENTION_PER_USER: int = int(os.getenv("MESSAGE_RETENTION_PER_USER", "0"))
+    RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+    RETENTION_INTERVAL_HOURS: float = float(os.getenv("RETENTION_INTERVAL_HOURS", "24"))
+    SQLITE_ARCHIVE_PATH: str = os.getenv("SQLITE_ARCHIVE_PATH", "bot_archive.db")
+
+    # Sharding: spread users over N database files (1 = single file)
+    SQLITE_SHARD_COUNT: int = int(os.getenv("SQLITE_SHARD_COUNT", "1"))
+
     # Bot Behavior Configuration
     CONVERSATION_HISTORY_LIMIT: int = int(os.getenv("CONVERSATION_HISTORY_LIMIT", "10"))
+    # Conversation scope: "guild" (one history per server) or "channel";
+    # DMs are always separate
+    CONVERSATION_SCOPE: str = os.getenv("CONVERSATION_SCOPE", "guild").lower()
     RAG_SEARCH_RESULTS: int = int(os.getenv("RAG_SEARCH_RESULTS", "2"))
     DISCORD_MESSAGE_LIMIT: int = 2000  # Discord's message length limit
+    # Stream replies into Discord as they are generated
+    AI_STREAMING: bool = os.getenv("AI_STREAMING", "false").lower() == "true"
+    # Minimum seconds between edits of a streamed message (Discord rate limits edits)
+    DISCORD_STREAM_EDIT_INTERVAL: float = float(
+        os.getenv("DISCORD_STREAM_EDIT_INTERVAL", "1.0")
+    )
+    TIMESERIES_MAX_POINTS: int = int(os.getenv("TIMESERIES_MAX_POINTS", "500"))
+
+    # Context Window: prompts are trimmed to fit before they are sent
+    DEFAULT_CONTEXT_WINDOW: int = int(os.getenv("DEFAULT_CONTEXT_WINDOW", "8192"))
+    # Per-model windows in tokens, e.g. "openai/gpt-4o=128000"
+    MODEL_CONTEXT_WINDOWS: Dict[str, int] = _parse_int_map(
+        os.getenv("MODEL_CONTEXT_WINDOWS", "")
+    )
+    # Tokens left free in the window for the answer
+    AI_COMPLETION_RESERVE_TOKENS: int = int(
+        os.getenv("AI_COMPLETION_RESERVE_TOKENS", "1024")
+    )
+    # Upper bound on prompt size regardless of the window (0 = window only)
+    AI_PROMPT_TOKEN_BUDGET: int = int(os.getenv("AI_PROMPT_TOKEN_BUDGET", "0"))
+
+    # History Token Budget (0 falls back to CONVERSATION_HISTORY_LIMIT messages)
+    HISTORY_TOKEN_BUDGET: int = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+    HISTORY_MAX_MESSAGES: int = int(os.getenv("HISTORY_MAX_MESSAGES", "50"))
+    # Per-model overrides, e.g.
+    # "openai/gpt-4o=6000,meta-llama/llama-3.1-8b-instruct:free=1500"
+    MODEL_HISTORY_TOKEN_BUDGETS: Dict[str, int] = _parse_int_map(
+        os.getenv("MODEL_HISTORY_TOKEN_BUDGETS", "")
+    )
+
+    # Conversation Summaries (off by default: each summary is a paid LLM call)
+    SUMMARY_ENABLED: bool = os.getenv("SUMMARY_ENABLED", "false").lower() == "true"
+    # Summarize once this many messages older than the recent window are unsummarized
+    SUMMARY_TRIGGER_MESSAGES: int = int(os.getenv("SUMMARY_TRIGGER_MESSAGES", "20"))
+    # Newest messages left out of the summary (they are sent raw)
+    SUMMARY_KEEP_RECENT: int = int(os.getenv("SUMMARY_KEEP_RECENT", "10"))
+    SUMMARY_MAX_MESSAGES: int = int(os.getenv("SUMMARY_MAX_MESSAGES", "100"))
+
+    # AI Response Cache (identical prompts with identical context)
+    RESPONSE_CACHE_ENABLED: bool = (
+        os.getenv("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    )
+    RESPONSE_CACHE_TTL_SECONDS: float = float(
+        os.getenv("RESPONSE_CACHE_TTL_SECONDS", "3600")
+    )
+    RESPONSE_CACHE_MAX_ENTRIES: int = int(
+        os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000")
+    )
+    RESPONSE_CACHE_MAX_BYTES: int = int(
+        os.getenv("RESPONSE_CACHE_MAX_BYTES", str(16 * 1024 * 1024))
+    )
+    # SQLite file for a persistent second tier (empty = memory only)
+    RESPONSE_CACHE_DB_PATH: str = os.getenv("RESPONSE_CACHE_DB_PATH", "")
+    RESPONSE_CACHE_DB_MAX_ENTRIES: int = int(
+        os.getenv("RESPONSE_CACHE_DB_MAX_ENTRIES", "50000")
+    )
+    # Channel ids that never get cached answers, e.g. "123,456"
+    RESPONSE_CACHE_DISABLED_CHANNELS: FrozenSet[str] = _parse_set(
+        os.getenv("RESPONSE_CACHE_DISABLED_CHANNELS", "")
+    )
 
     # Logging Configuration
     LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
@@ -40,6 +222,13 @@ class Settings:
         "Você mantém o contexto das conversas anteriores."
     )
 
+    SUMMARY_PROMPT: str = (
+        "Você resume conversas entre um usuário e um assistente. "
+        "Atualize o resumo com as novas mensagens, mantendo fatos, preferências "
+        "e pedidos importantes do usuário. Responda apenas com o resumo, em "
+        "português, em no máximo 200 palavras."
+    )
+
     @classmethod
     def validate(cls) -> list[str]:
         """Validate required configuration settings"""
@@ -57,10 +246,31 @@ class Settings:
         return errors
 
     @classmethod
-    def get_system_prompt(cls, rag_context: Optional[str] = None) -> str:
-        """Get system prompt with optional RAG context"""
+    def get_history_token_budget(cls, model: str) -> Optional[int]:
+        """Get the history token budget for a model (None when disabled)"""
+        budget = cls.MODEL_HISTORY_TOKEN_BUDGETS.get(model, cls.HISTORY_TOKEN_BUDGET)
+        return budget if budget > 0 else None
+
+    @classmethod
+    def get_context_window(cls, model: str) -> int:
+        """Get the context window of a model in tokens"""
+        return cls.MODEL_CONTEXT_WINDOWS.get(model, cls.DEFAULT_CONTEXT_WINDOW)
+
+    @classmethod
+    def get_system_prompt(
+        cls,
+        rag_context: Optional[str] = None,
+        conversation_summary: Optional[str] = None
+    ) -> str:
+        """Get system prompt with optional conversation summary and RAG context"""
         prompt = cls.SYSTEM_PROMPT
 
+        if conversation_summary:
+            prompt += (
+                "\n\nResumo da conversa anterior com este usuário:\n"
+                f"{conversation_summary}"
+            )
+
         if rag_context:
             prompt += f"\n\nContexto relevante da base de conhecimento:\n{rag_context}"
 
@@ -1,5 +1,6 @@
 """Database management modules"""
 
-from .sqlite_db import db, SQLiteDatabase
+from .sharded_db import ShardedDatabase
+from .sqlite_db import SQLiteDatabase, db, readonly_db
 
-__all__ = ["db", "SQLiteDatabase"]
+__all__ = ["db", "readonly_db", "SQLiteDatabase", "ShardedDatabase"]
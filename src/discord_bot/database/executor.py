@@ -0,0 +1,79 @@
+"""
+Dedicated worker thread that runs blocking database calls off the event loop.
+"""
+import asyncio
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable
+
+from ..config.settings import settings
+
+
+class DatabaseExecutor:
+    """Single worker thread fed by a bounded queue of database calls"""
+
+    def __init__(self, max_queue_size: int = None, name: str = "sqlite-executor"):
+        self._queue: queue.Queue = queue.Queue(
+            maxsize=max_queue_size or settings.SQLITE_EXECUTOR_QUEUE_SIZE
+        )
+        self._shutdown = False
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def _worker(self):
+        """Run queued calls until the shutdown sentinel is received"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+
+            future, fn, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def _make_item(self, fn: Callable, args: tuple, kwargs: dict):
+        """Build a queue item, refusing new work after shutdown"""
+        if self._shutdown:
+            raise RuntimeError("Database executor has been shut down")
+        return Future(), fn, args, kwargs
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Queue a call from synchronous code, blocking while the queue is full"""
+        item = self._make_item(fn, args, kwargs)
+        self._queue.put(item)
+        return item[0]
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        Queue a call and await its result.
+
+        When the queue is full the coroutine yields to the event loop and
+        retries instead of blocking it, which gives callers backpressure.
+        """
+        item = self._make_item(fn, args, kwargs)
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                break
+            except queue.Full:
+                await asyncio.sleep(0.01)
+
+        return await asyncio.wrap_future(item[0])
+
+    def shutdown(self, wait: bool = True):
+        """Stop the worker once every call already queued has run"""
+        if self._shutdown:
+            return
+        self._shutdown = True
+        self._queue.put(None)
+
+        if wait and threading.current_thread() is not self._thread:
+            self._thread.join()
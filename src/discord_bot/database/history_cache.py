@@ -0,0 +1,281 @@
+"""
+In-memory LRU cache of recent conversation history windows.
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from ..config.settings import settings
+
+# (id, role, content, token_count); id is None while the message is buffered
+HistoryRow = Tuple[Optional[int], str, str, int]
+
+
+def fit_history(
+    rows: List[HistoryRow],
+    limit: int,
+    token_budget: Optional[int] = None
+) -> Tuple[List[Dict[str, str]], bool]:
+    """
+    Select the newest messages within a message limit and token budget.
+
+    Args:
+        rows: Messages in chronological order
+        limit: Maximum number of messages
+        token_budget: Maximum total tokens, or None for no budget
+
+    Returns:
+        The selected messages in chronological order, and whether the
+        selection stopped because ``rows`` ran out (rather than because
+        the limit or budget was reached)
+    """
+    selected: List[Dict[str, str]] = []
+    used = 0
+
+    for _, role, content, tokens in reversed(rows):
+        if len(selected) >= limit:
+            return selected[::-1], False
+        if token_budget is not None and used + tokens > token_budget:
+            return selected[::-1], False
+        used += tokens
+        selected.append({"role": role, "content": content})
+
+    return selected[::-1], len(selected) < limit
+
+
+def after_summary(
+    rows: List[HistoryRow],
+    summary: Optional[Dict]
+) -> Tuple[List[HistoryRow], bool]:
+    """
+    Drop the messages a conversation summary already covers.
+
+    Buffered messages (no id yet) are newer than any summarized message.
+
+    Returns:
+        The remaining rows, and whether any row was dropped (the summary's
+        cutoff falls within ``rows``)
+    """
+    if not summary:
+        return rows, False
+    last_id = summary["last_message_id"]
+    kept = [row for row in rows if row[0] is None or row[0] > last_id]
+    return kept, len(kept) < len(rows)
+
+
+class _CacheEntry:
+    """Most recent messages of one conversation"""
+
+    __slots__ = ("rows", "complete", "summary", "size")
+
+    def __init__(
+        self,
+        rows: List[HistoryRow],
+        complete: bool,
+        summary: Optional[Dict] = None
+    ):
+        self.rows = rows
+        # True when ``rows`` holds the whole conversation, so a request for
+        # more messages than are cached can still be answered
+        self.complete = complete
+        # Conversation summary as stored: summary text and last_message_id
+        self.summary = summary
+        self.size = sum(_row_size(row) for row in rows) + (
+            len(summary["summary"].encode("utf-8")) if summary else 0
+        )
+
+
+def _row_size(row: HistoryRow) -> int:
+    """Approximate memory footprint of a cached message in bytes"""
+    return len(row[2].encode("utf-8")) + len(row[1]) + 72
+
+
+class HistoryCache:
+    """
+    Bounded LRU of each conversation's most recent messages.
+
+    Bounded both by number of conversations and by total bytes. Entries are
+    kept up to date by write-through (``append``/``reset``), so repeated
+    reads of an active conversation never touch SQLite. Each entry also
+    holds the conversation's summary, so the messages it covers can be
+    left out without a query. Keys are ``(user_id, scope)`` tuples.
+    """
+
+    def __init__(
+        self,
+        max_users: int = None,
+        max_bytes: int = None,
+        window: int = None
+    ):
+        if max_users is None:
+            max_users = settings.HISTORY_CACHE_MAX_USERS
+        if max_bytes is None:
+            max_bytes = settings.HISTORY_CACHE_MAX_BYTES
+        self.max_users = max_users
+        self.max_bytes = max_bytes
+        self.window = window or settings.HISTORY_CACHE_WINDOW
+
+        self._entries: "OrderedDict[Hashable, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def generation(self) -> int:
+        """Counter bumped on every write, used to detect racing populates"""
+        return self._generation
+
+    def get(
+        self,
+        key: Hashable,
+        limit: int,
+        token_budget: Optional[int] = None
+    ) -> Optional[List[Dict[str, str]]]:
+        """Get the newest messages within limit and budget, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                history, exhausted = fit_history(entry.rows, limit, token_budget)
+                if not exhausted or entry.complete:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return history
+
+            self.misses += 1
+            return None
+
+    def get_context(
+        self,
+        key: Hashable,
+        limit: int,
+        token_budget: Optional[int] = None
+    ) -> Optional[Tuple[List[Dict[str, str]], Optional[Dict]]]:
+        """
+        Get the summary and the newest messages it does not cover.
+
+        Returns:
+            (messages, summary), or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                rows, cut = after_summary(entry.rows, entry.summary)
+                history, exhausted = fit_history(rows, limit, token_budget)
+                if not exhausted or cut or entry.complete:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return history, entry.summary
+
+            self.misses += 1
+            return None
+
+    def populate(
+        self,
+        key: Hashable,
+        rows: List[HistoryRow],
+        complete: bool,
+        generation: int,
+        summary: Optional[Dict] = None
+    ):
+        """
+        Store messages read from the database.
+
+        Args:
+            key: Conversation key
+            rows: Newest messages in chronological order
+            complete: Whether ``rows`` is the whole conversation
+            generation: Value of ``generation`` taken before the read; the
+                entry is dropped if a write happened in between
+            summary: The conversation's summary, read along with ``rows``
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            if len(rows) > self.window:
+                rows, complete = rows[-self.window:], False
+            self._store(key, _CacheEntry(list(rows), complete, summary))
+
+    def append(self, key: Hashable, row: HistoryRow):
+        """Write-through a newly saved message to a cached conversation"""
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+
+            entry.rows.append(row)
+            entry.size += _row_size(row)
+            self._bytes += _row_size(row)
+
+            while len(entry.rows) > self.window:
+                removed = entry.rows.pop(0)
+                entry.size -= _row_size(removed)
+                self._bytes -= _row_size(removed)
+                entry.complete = False
+
+            self._entries.move_to_end(key)
+            self._evict()
+
+    def reset(self, key: Hashable):
+        """Mark a conversation as known to be empty"""
+        with self._lock:
+            self._generation += 1
+            self._store(key, _CacheEntry([], True))
+
+    def invalidate(self, key: Hashable):
+        """Forget a cached conversation"""
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    def invalidate_user(self, user_id: str):
+        """Forget every cached conversation of a user, in all scopes"""
+        with self._lock:
+            self._generation += 1
+            for key in [key for key in self._entries if key[0] == user_id]:
+                self._bytes -= self._entries.pop(key).size
+
+    def clear(self):
+        """Forget every cached conversation"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        """Get cache size and hit/miss counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "users": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+    def _store(self, key: Hashable, entry: _CacheEntry):
+        """Insert or replace an entry; callers must hold the lock"""
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._bytes -= previous.size
+
+        self._entries[key] = entry
+        self._bytes += entry.size
+        self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until within bounds"""
+        while self._entries and (
+            len(self._entries) > self.max_users or self._bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
@@ -0,0 +1,389 @@
+"""
+Versioned schema migrations for the SQLite database.
+
+Migrations run in order at startup, each one inside its own transaction,
+and are recorded in the ``schema_version`` table so they are applied only
+once. To change the schema, append a new step to ``MIGRATIONS``; never
+edit a step that has already shipped.
+"""
+import sqlite3
+from typing import Callable, List, NamedTuple
+
+from ..utils.logging_config import logger as bot_logger
+
+
+class Migration(NamedTuple):
+    """A single schema change"""
+
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Cursor], None]
+
+
+def _initial_schema(cursor: sqlite3.Cursor):
+    """Create the original users, messages and stats tables"""
+    # Users table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            username TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    # Messages table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            role TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+    # Stats table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS stats (
+            user_id TEXT PRIMARY KEY,
+            message_count INTEGER DEFAULT 0,
+            last_interaction TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+
+def _index_messages_by_user(cursor: sqlite3.Cursor):
+    """Index messages by (user_id, id DESC) for per-user lookups"""
+    # Serves both the user_id filter and the newest-first ordering, so history
+    # reads are an index seek plus LIMIT row fetches and deletes by user_id
+    # no longer scan the whole table.
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_user_id
+        ON messages (user_id, id DESC)
+    """)
+
+
+def _global_stats_counters(cursor: sqlite3.Cursor):
+    """Maintain global user/message counters instead of COUNT(*) scans"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS global_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+
+    # Triggers keep the counters in the same transaction as every insert and
+    # delete, whichever code path performs it
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_insert_count
+        AFTER INSERT ON users
+        BEGIN
+            UPDATE global_stats SET value = value + 1 WHERE name = 'total_users';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_users_delete_count
+        AFTER DELETE ON users
+        BEGIN
+            UPDATE global_stats SET value = value - 1 WHERE name = 'total_users';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_insert_count
+        AFTER INSERT ON messages
+        BEGIN
+            UPDATE global_stats SET value = value + 1 WHERE name = 'total_messages';
+            UPDATE global_stats SET value = value + 1
+            WHERE name = 'user_messages' AND NEW.role = 'user';
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_delete_count
+        AFTER DELETE ON messages
+        BEGIN
+            UPDATE global_stats SET value = value - 1 WHERE name = 'total_messages';
+            UPDATE global_stats SET value = value - 1
+            WHERE name = 'user_messages' AND OLD.role = 'user';
+        END
+    """)
+
+    reconcile_global_stats(cursor)
+
+
+def reconcile_global_stats(cursor: sqlite3.Cursor):
+    """Rebuild the global counters from the users and messages tables"""
+    cursor.execute("""
+        INSERT OR REPLACE INTO global_stats (name, value)
+        VALUES
+            ('total_users', (SELECT COUNT(*) FROM users)),
+            ('total_messages', (SELECT COUNT(*) FROM messages)),
+            ('user_messages', (SELECT COUNT(*) FROM messages WHERE role = 'user'))
+    """)
+
+
+def _message_token_counts(cursor: sqlite3.Cursor):
+    """Store a token estimate with every message, computed at write time"""
+    cursor.execute("""
+        ALTER TABLE messages
+        ADD COLUMN token_count INTEGER NOT NULL DEFAULT 0
+    """)
+
+    # Same formula as utils.tokens.estimate_message_tokens
+    cursor.execute("""
+        UPDATE messages
+        SET token_count = (length(content) + 3) / 4 + 4
+    """)
+
+
+def _conversation_summaries(cursor: sqlite3.Cursor):
+    """Store a rolling summary of each user's older conversation turns"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversation_summaries (
+            user_id TEXT PRIMARY KEY,
+            summary TEXT NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+
+
+def _conversation_scopes(cursor: sqlite3.Cursor):
+    """Partition messages and summaries by conversation scope"""
+    # Existing rows predate scoping and keep the empty legacy scope
+    cursor.execute("""
+        ALTER TABLE messages
+        ADD COLUMN scope TEXT NOT NULL DEFAULT ''
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_messages_user_scope
+        ON messages (user_id, scope, id DESC)
+    """)
+    # Superseded: (user_id, scope, id) also serves user-only lookups
+    cursor.execute("DROP INDEX IF EXISTS idx_messages_user_id")
+
+    cursor.execute("""
+        CREATE TABLE conversation_summaries_scoped (
+            user_id TEXT NOT NULL,
+            scope TEXT NOT NULL DEFAULT '',
+            summary TEXT NOT NULL,
+            last_message_id INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, scope),
+            FOREIGN KEY (user_id) REFERENCES users(user_id)
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO conversation_summaries_scoped
+            (user_id, scope, summary, last_message_id, updated_at)
+        SELECT user_id, '', summary, last_message_id, updated_at
+        FROM conversation_summaries
+    """)
+    cursor.execute("DROP TABLE conversation_summaries")
+    cursor.execute(
+        "ALTER TABLE conversation_summaries_scoped RENAME TO conversation_summaries"
+    )
+
+
+def _message_search_index(cursor: sqlite3.Cursor):
+    """Index message content with FTS5, kept in sync by triggers"""
+    try:
+        cursor.execute("""
+            CREATE VIRTUAL TABLE messages_fts USING fts5(
+                content,
+                content='messages',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: search falls back to LIKE scans
+        bot_logger.get_logger().warning(
+            f"FTS5 unavailable, message search will scan the table: {e}"
+        )
+        return
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_fts_insert
+        AFTER INSERT ON messages
+        BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_fts_delete
+        AFTER DELETE ON messages
+        BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_messages_fts_update
+        AFTER UPDATE OF content ON messages
+        BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content)
+            VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """)
+
+    # Index the messages that already exist
+    cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+
+def _activity_rollups(cursor: sqlite3.Cursor):
+    """Hourly activity counters per guild, plus a '*' row for the whole bot"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_rollups (
+            bucket_start TEXT NOT NULL,
+            guild_id TEXT NOT NULL,
+            messages INTEGER NOT NULL DEFAULT 0,
+            user_messages INTEGER NOT NULL DEFAULT 0,
+            bot_responses INTEGER NOT NULL DEFAULT 0,
+            latency_ms_total REAL NOT NULL DEFAULT 0,
+            latency_samples INTEGER NOT NULL DEFAULT 0,
+            unique_users INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (bucket_start, guild_id)
+        ) WITHOUT ROWID
+    """)
+    # Users seen per recent bucket, so unique_users is counted once per user
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS activity_rollup_users (
+            bucket_start TEXT NOT NULL,
+            guild_id TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            PRIMARY KEY (guild_id, bucket_start, user_id)
+        ) WITHOUT ROWID
+    """)
+
+    # Backfill from history; latency was never recorded for these messages,
+    # and guild is only known for messages stored under a guild scope
+    backfills = (("'*'", "1"), ("substr(scope, 7)", "scope LIKE 'guild:%'"))
+    for guild_expr, where in backfills:
+        cursor.execute(f"""
+            INSERT INTO activity_rollups
+                (bucket_start, guild_id, messages, user_messages, bot_responses,
+                 unique_users)
+            SELECT strftime('%Y-%m-%d %H:00:00', timestamp), {guild_expr},
+                   COUNT(*),
+                   SUM(role = 'user'),
+                   SUM(role != 'user'),
+                   COUNT(DISTINCT CASE WHEN role = 'user' THEN user_id END)
+            FROM messages
+            WHERE {where}
+            GROUP BY 1, 2
+        """)
+        cursor.execute(f"""
+            INSERT OR IGNORE INTO activity_rollup_users
+                (bucket_start, guild_id, user_id)
+            SELECT DISTINCT strftime('%Y-%m-%d %H:00:00', timestamp), {guild_expr},
+                   user_id
+            FROM messages
+            WHERE role = 'user' AND {where}
+        """)
+
+
+def _prune_activity_rollup_users(cursor: sqlite3.Cursor):
+    """Keep per-user rollup rows only for the buckets still being written"""
+    # The backfill stored every past hour; only unique_users de-duplication
+    # needs them, and only for the current and previous hour
+    cursor.execute("""
+        DELETE FROM activity_rollup_users
+        WHERE bucket_start < strftime('%Y-%m-%d %H:00:00', 'now', '-1 hour')
+    """)
+
+
+def _database_meta(cursor: sqlite3.Cursor):
+    """Key/value facts about the database file itself, e.g. its shard layout"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS database_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    """)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "initial_schema", _initial_schema),
+    Migration(2, "index_messages_by_user", _index_messages_by_user),
+    Migration(3, "global_stats_counters", _global_stats_counters),
+    Migration(4, "message_token_counts", _message_token_counts),
+    Migration(5, "conversation_summaries", _conversation_summaries),
+    Migration(6, "conversation_scopes", _conversation_scopes),
+    Migration(7, "message_search_index", _message_search_index),
+    Migration(8, "activity_rollups", _activity_rollups),
+    Migration(9, "prune_activity_rollup_users", _prune_activity_rollup_users),
+    Migration(10, "database_meta", _database_meta),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Get the highest migration version applied to the database"""
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def apply_migrations(conn: sqlite3.Connection) -> List[Migration]:
+    """
+    Apply every pending migration to the database.
+
+    Args:
+        conn: Connection to migrate; must not be inside a transaction
+
+    Returns:
+        The migrations that were applied, in order
+    """
+    if conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0:
+        # New database: enable incremental auto_vacuum while the VACUUM it
+        # needs (WAL mode already wrote the header) is instant; existing
+        # databases are converted with `archive_messages --vacuum`
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+    current_version = get_schema_version(conn)
+    applied = []
+
+    for migration in MIGRATIONS:
+        if migration.version <= current_version:
+            continue
+
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+
+            # Another process may have migrated while we waited for the lock
+            cursor.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?",
+                (migration.version,)
+            )
+            if cursor.fetchone():
+                conn.rollback()
+                continue
+
+            migration.apply(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, name) VALUES (?, ?)",
+                (migration.version, migration.name)
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        applied.append(migration)
+
+    return applied
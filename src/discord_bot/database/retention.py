@@ -0,0 +1,224 @@
+"""
+Message retention policy and the compressed archive database.
+"""
+import sqlite3
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from ..config.settings import settings
+
+# (id, user_id, role, content, timestamp, scope)
+MessageRow = Tuple[int, str, str, str, str, str]
+
+
+class RetentionPolicy:
+    """
+    Decides which messages have left the hot database's retention window.
+
+    Messages older than ``max_age_days``, and messages beyond the newest
+    ``keep_per_user`` of each user, are expired. Zero disables a rule.
+    """
+
+    def __init__(
+        self,
+        max_age_days: int = None,
+        keep_per_user: int = None,
+        batch_size: int = None
+    ):
+        if max_age_days is None:
+            max_age_days = settings.MESSAGE_RETENTION_DAYS
+        if keep_per_user is None:
+            keep_per_user = settings.MESSAGE_RETENTION_PER_USER
+        self.max_age_days = max_age_days
+        self.keep_per_user = keep_per_user
+        self.batch_size = batch_size or settings.RETENTION_BATCH_SIZE
+        # Last conversation fully trimmed by the count rule in this pass
+        self._count_after: Optional[Tuple[str, str]] = None
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any retention rule is configured"""
+        return self.max_age_days > 0 or self.keep_per_user > 0
+
+    def reset(self):
+        """Start a new pass over the database; call before the first batch"""
+        self._count_after = None
+
+    def expired_batch(self, cursor: sqlite3.Cursor) -> List[MessageRow]:
+        """
+        Get up to ``batch_size`` expired messages, oldest first.
+
+        Batches are meant to be deleted before the next one is requested:
+        conversations trimmed by the count rule are not revisited in the
+        same pass.
+        """
+        rows: List[MessageRow] = []
+
+        if self.max_age_days > 0:
+            rows = self._expired_by_age(cursor)
+
+        if not rows and self.keep_per_user > 0:
+            rows = self._expired_by_count(cursor)
+
+        return rows
+
+    def _expired_by_age(self, cursor: sqlite3.Cursor) -> List[MessageRow]:
+        """Messages older than the age limit"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.max_age_days)
+
+        # ids grow with time, so everything before the first message newer
+        # than the cutoff is expired; this stops scanning at that message
+        # instead of filtering the whole table on the unindexed timestamp
+        cursor.execute("""
+            SELECT id FROM messages
+            WHERE timestamp >= ?
+            ORDER BY id
+            LIMIT 1
+        """, (cutoff.strftime("%Y-%m-%d %H:%M:%S"),))
+        row = cursor.fetchone()
+
+        if row is None:
+            cursor.execute("""
+                SELECT id, user_id, role, content, timestamp, scope
+                FROM messages
+                ORDER BY id
+                LIMIT ?
+            """, (self.batch_size,))
+        else:
+            cursor.execute("""
+                SELECT id, user_id, role, content, timestamp, scope
+                FROM messages
+                WHERE id < ?
+                ORDER BY id
+                LIMIT ?
+            """, (row[0], self.batch_size))
+
+        return cursor.fetchall()
+
+    def _expired_by_count(self, cursor: sqlite3.Cursor) -> List[MessageRow]:
+        """Messages beyond the newest ``keep_per_user`` of each conversation"""
+        # Conversations are walked in (user_id, scope) order, resuming after
+        # the last one finished, so each batch only scans the index from
+        # there instead of grouping the whole table again
+        if self._count_after is None:
+            cursor.execute("""
+                SELECT user_id, scope
+                FROM messages
+                GROUP BY user_id, scope
+                HAVING COUNT(*) > ?
+                ORDER BY user_id, scope
+                LIMIT ?
+            """, (self.keep_per_user, self.batch_size))
+        else:
+            cursor.execute("""
+                SELECT user_id, scope
+                FROM messages
+                WHERE (user_id, scope) > (?, ?)
+                GROUP BY user_id, scope
+                HAVING COUNT(*) > ?
+                ORDER BY user_id, scope
+                LIMIT ?
+            """, (*self._count_after, self.keep_per_user, self.batch_size))
+        conversations = cursor.fetchall()
+
+        rows: List[MessageRow] = []
+        for user_id, scope in conversations:
+            remaining = self.batch_size - len(rows)
+            if remaining <= 0:
+                break
+
+            cursor.execute("""
+                SELECT id, user_id, role, content, timestamp, scope
+                FROM messages
+                WHERE user_id = ? AND scope = ?
+                  AND id <= (
+                      SELECT id FROM messages
+                      WHERE user_id = ? AND scope = ?
+                      ORDER BY id DESC
+                      LIMIT 1 OFFSET ?
+                  )
+                ORDER BY id
+                LIMIT ?
+            """, (user_id, scope, user_id, scope, self.keep_per_user, remaining))
+            expired = cursor.fetchall()
+            rows.extend(expired)
+
+            if len(expired) >= remaining:
+                # May have more expired messages: the next batch resumes here
+                break
+            self._count_after = (user_id, scope)
+
+        return rows
+
+
+class ArchiveStore:
+    """Append-only archive database with zlib-compressed message content"""
+
+    def __init__(self, archive_path: str = None):
+        self.archive_path = archive_path or settings.SQLITE_ARCHIVE_PATH
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Open the archive database, creating its table on first use"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(
+                self.archive_path,
+                timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000
+            )
+            self._conn.execute("PRAGMA journal_mode = WAL")
+            self._conn.execute("PRAGMA synchronous = NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS archived_messages (
+                    id INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content BLOB NOT NULL,
+                    timestamp TIMESTAMP,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    scope TEXT NOT NULL DEFAULT ''
+                )
+            """)
+            columns = {
+                row[1]
+                for row in self._conn.execute("PRAGMA table_info(archived_messages)")
+            }
+            if "scope" not in columns:
+                # Archives created before conversations were scoped
+                self._conn.execute("""
+                    ALTER TABLE archived_messages
+                    ADD COLUMN scope TEXT NOT NULL DEFAULT ''
+                """)
+            self._conn.execute("""
+                CREATE INDEX IF NOT EXISTS idx_archived_messages_user_id
+                ON archived_messages (user_id, id)
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def store(self, rows: List[MessageRow]):
+        """Durably archive messages; rows already archived are skipped"""
+        conn = self._get_connection()
+        conn.executemany("""
+            INSERT OR IGNORE INTO archived_messages
+                (id, user_id, role, content, timestamp, scope)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                msg_id, user_id, role, zlib.compress(content.encode("utf-8")),
+                timestamp, scope
+            )
+            for msg_id, user_id, role, content, timestamp, scope in rows
+        ])
+        conn.commit()
+
+    def close(self):
+        """Close the archive connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def decompress_content(blob: bytes) -> str:
+    """Decode message content stored in the archive"""
+    return zlib.decompress(blob).decode("utf-8")
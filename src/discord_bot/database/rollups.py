@@ -0,0 +1,175 @@
+"""
+Hourly activity rollups, maintained on the message write path.
+"""
+import math
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from ..config.settings import settings
+
+# Rollup rows for the whole bot use this guild_id
+ALL_GUILDS = "*"
+
+BUCKET_FORMAT = "%Y-%m-%d %H:00:00"
+
+# Hours of per-user rows kept to de-duplicate unique_users: writes only land
+# in the current hour, or the previous one when a batch straddles the hour
+USER_BUCKET_HOURS = 2
+
+
+def bucket_start(moment: datetime) -> str:
+    """Get the hourly bucket (UTC, as stored) a moment falls into"""
+    return moment.strftime(BUCKET_FORMAT)
+
+
+def hour_ceil(moment: datetime) -> datetime:
+    """Round a moment up to the next full hour, unless it is on one"""
+    floor = moment.replace(minute=0, second=0, microsecond=0)
+    return floor if floor == moment else floor + timedelta(hours=1)
+
+
+def update_rollups(cursor: sqlite3.Cursor, messages: Iterable):
+    """
+    Add a batch of newly written messages to the hourly rollups.
+
+    Args:
+        cursor: Cursor on the open write transaction
+        messages: ``PendingMessage`` objects; ``guild_id`` adds a per-guild
+            row and ``latency_ms`` (on replies) feeds the average latency
+    """
+    totals: Dict[Tuple[str, str], List] = {}
+    users: Set[Tuple[str, str, str]] = set()
+
+    for m in messages:
+        bucket = bucket_start(m.created_at)
+        for guild_id in {ALL_GUILDS, m.guild_id or ALL_GUILDS}:
+            # messages, user_messages, bot_responses, latency_ms_total, latency_samples
+            entry = totals.setdefault((bucket, guild_id), [0, 0, 0, 0.0, 0])
+            entry[0] += 1
+            if m.role == "user":
+                entry[1] += 1
+                users.add((bucket, guild_id, m.user_id))
+            else:
+                entry[2] += 1
+            if m.latency_ms is not None:
+                entry[3] += m.latency_ms
+                entry[4] += 1
+
+    # The first write of a new hour drops per-user rows no write can reach
+    newest = max((bucket for bucket, _ in totals), default=None)
+    if newest is not None:
+        cursor.execute("""
+            SELECT 1 FROM activity_rollups WHERE bucket_start = ? AND guild_id = ?
+        """, (newest, ALL_GUILDS))
+        if cursor.fetchone() is None:
+            prune_rollup_users(cursor, datetime.strptime(newest, BUCKET_FORMAT))
+
+    cursor.executemany("""
+        INSERT INTO activity_rollups
+            (bucket_start, guild_id, messages, user_messages, bot_responses,
+             latency_ms_total, latency_samples)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(bucket_start, guild_id) DO UPDATE SET
+            messages = messages + excluded.messages,
+            user_messages = user_messages + excluded.user_messages,
+            bot_responses = bot_responses + excluded.bot_responses,
+            latency_ms_total = latency_ms_total + excluded.latency_ms_total,
+            latency_samples = latency_samples + excluded.latency_samples
+    """, [(bucket, guild_id, *entry) for (bucket, guild_id), entry in totals.items()])
+
+    # A user counts once per bucket: only bump the counter on first sight
+    for bucket, guild_id, user_id in users:
+        cursor.execute("""
+            INSERT OR IGNORE INTO activity_rollup_users
+                (bucket_start, guild_id, user_id)
+            VALUES (?, ?, ?)
+        """, (bucket, guild_id, user_id))
+        if cursor.rowcount == 1:
+            cursor.execute("""
+                UPDATE activity_rollups
+                SET unique_users = unique_users + 1
+                WHERE bucket_start = ? AND guild_id = ?
+            """, (bucket, guild_id))
+
+
+def prune_rollup_users(cursor: sqlite3.Cursor, current_bucket: datetime):
+    """Delete per-user rows of buckets that can no longer receive writes"""
+    cutoff = current_bucket - timedelta(hours=USER_BUCKET_HOURS - 1)
+    cursor.execute(
+        "DELETE FROM activity_rollup_users WHERE bucket_start < ?",
+        (bucket_start(cutoff),)
+    )
+
+
+def query_timeseries(
+    cursor: sqlite3.Cursor,
+    start: datetime,
+    end: datetime,
+    step_hours: int = 1,
+    guild_id: Optional[str] = None,
+    max_points: int = None
+) -> Dict:
+    """
+    Read activity per time step from the rollups.
+
+    Only the hourly counter rows are read, one per hour in range, so the
+    cost does not grow with the number of messages or users.
+
+    Args:
+        cursor: Read cursor
+        start: Start of the range (naive UTC), rounded down to the hour
+        end: End of the range (naive UTC, exclusive), rounded up to the
+            hour so the current, partial hour is included
+        step_hours: Hours per point; raised if the range would need more
+            than ``max_points`` points
+        guild_id: Only count this guild's activity
+        max_points: Maximum number of points returned
+
+    Returns:
+        Dict with the effective ``step_hours`` and the ``points``, one per
+        step (empty steps included so charts stay continuous). Distinct
+        users cannot be added up across hours, so a point's
+        ``unique_users`` is that of its busiest hour; exact for 1h steps.
+    """
+    max_points = max_points or settings.TIMESERIES_MAX_POINTS
+    start = start.replace(minute=0, second=0, microsecond=0)
+    end = hour_ceil(end)
+    total_hours = max(math.ceil((end - start).total_seconds() / 3600), 1)
+    step_hours = max(step_hours, math.ceil(total_hours / max_points), 1)
+    step_seconds = step_hours * 3600
+    key = guild_id or ALL_GUILDS
+
+    # Bucket index of each hourly row within the requested step
+    cursor.execute("""
+        SELECT (strftime('%s', bucket_start) - strftime('%s', ?)) / ? AS step,
+               SUM(messages), SUM(user_messages), SUM(bot_responses),
+               SUM(latency_ms_total), SUM(latency_samples), MAX(unique_users)
+        FROM activity_rollups
+        WHERE guild_id = ? AND bucket_start >= ? AND bucket_start < ?
+        GROUP BY step
+    """, (
+        bucket_start(start), step_seconds,
+        key, bucket_start(start), bucket_start(end)
+    ))
+    totals = {row[0]: row[1:] for row in cursor.fetchall()}
+
+    points = []
+    for step in range(math.ceil(total_hours / step_hours)):
+        (
+            messages, user_messages, bot_responses,
+            latency_total, latency_samples, unique_users
+        ) = totals.get(step, (0, 0, 0, 0, 0, 0))
+        points.append({
+            "start": (start + timedelta(seconds=step * step_seconds)).isoformat(),
+            "messages": messages,
+            "user_messages": user_messages,
+            "bot_responses": bot_responses,
+            "unique_users": unique_users,
+            "latency_samples": latency_samples,
+            "avg_latency_ms": (
+                round(latency_total / latency_samples, 1) if latency_samples else None
+            )
+        })
+
+    return {"step_hours": step_hours, "points": points}
@@ -0,0 +1,460 @@
+"""
+Hash-sharded storage spreading users across several SQLite files.
+"""
+import asyncio
+import heapq
+import itertools
+import sqlite3
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from ..config.settings import settings
+from .retention import RetentionPolicy
+from .sqlite_db import SQLiteDatabase
+
+
+def shard_path(path: str, index: int) -> str:
+    """Get the file of one shard, e.g. bot_data.db -> bot_data.shard0.db"""
+    base = Path(path)
+    return str(base.with_name(f"{base.stem}.shard{index}{base.suffix}"))
+
+
+class ShardedDatabase:
+    """
+    Drop-in replacement for ``SQLiteDatabase`` over N database files.
+
+    Each user lives in exactly one shard, chosen by a stable hash of the
+    user id, so per-user operations touch a single file. Every shard has
+    its own writer lock and executor thread, letting writes for users on
+    different shards proceed in parallel. Global queries fan out to all
+    shards and merge the results.
+    """
+
+    def __init__(
+        self,
+        shard_count: int = None,
+        db_path: str = None,
+        read_only: bool = False,
+        write_behind: bool = None
+    ):
+        shard_count = shard_count or settings.SQLITE_SHARD_COUNT
+        db_path = db_path or settings.SQLITE_DB_PATH
+        self.db_path = db_path
+        self.read_only = read_only
+        self.shards: List[SQLiteDatabase] = [
+            SQLiteDatabase(
+                shard_path(db_path, index),
+                read_only=read_only,
+                write_behind=write_behind,
+                archive_path=shard_path(settings.SQLITE_ARCHIVE_PATH, index)
+            )
+            for index in range(shard_count)
+        ]
+
+    def shard_for(self, user_id: str) -> SQLiteDatabase:
+        """Get the shard that stores a user"""
+        # crc32, unlike hash(), is stable across processes and restarts
+        return self.shards[zlib.crc32(user_id.encode("utf-8")) % len(self.shards)]
+
+    def init_database(self):
+        """
+        Initialize every shard and apply pending schema migrations.
+
+        Each shard records its position and the shard count on first use.
+        Users are placed by ``crc32(user_id) % shard_count``, so opening the
+        files with another count would silently hide most users' data.
+
+        Raises:
+            RuntimeError: If the shards were created with another shard
+                count, or the unsharded database still holds messages
+        """
+        self._check_unsharded_data()
+
+        for index, shard in enumerate(self.shards):
+            shard.init_database()
+
+            layout = f"{index}/{len(self.shards)}"
+            recorded = shard.get_meta("shard_layout")
+            if recorded is None:
+                shard.set_meta("shard_layout", layout)
+            elif recorded != layout:
+                raise RuntimeError(
+                    f"{shard.db_path} is shard {recorded} but SQLITE_SHARD_COUNT is "
+                    f"{len(self.shards)}; changing the shard count would move users "
+                    "to other shards. Restore "
+                    f"SQLITE_SHARD_COUNT={recorded.split('/')[1]}."
+                )
+
+    def _check_unsharded_data(self):
+        """Refuse to start while messages are still in the single-file database"""
+        try:
+            conn = sqlite3.connect(
+                f"{Path(self.db_path).resolve().as_uri()}?mode=ro", uri=True
+            )
+        except sqlite3.OperationalError:
+            return  # no such file
+
+        try:
+            has_messages = conn.execute(
+                "SELECT EXISTS (SELECT 1 FROM messages)"
+            ).fetchone()[0]
+        except sqlite3.OperationalError:
+            has_messages = False  # not initialized
+        finally:
+            conn.close()
+
+        if has_messages:
+            raise RuntimeError(
+                f"{self.db_path} holds messages that sharded storage would ignore; "
+                "keep SQLITE_SHARD_COUNT=1, or move the file away to start with "
+                "empty shards"
+            )
+
+    def flush(self):
+        """Write every buffered message to disk now"""
+        for shard in self.shards:
+            shard.flush()
+
+    def close(self):
+        """Stop every shard's executor and close its connections"""
+        for shard in self.shards:
+            shard.close()
+
+    # Per-user operations: routed to the user's shard
+
+    def add_user(self, user_id: str, username: str):
+        """Add or update a user in the database"""
+        return self.shard_for(user_id).add_user(user_id, username)
+
+    def save_message(self, user_id: str, role: str, content: str, scope: str = ""):
+        """Save a message to the conversation history of a user in a scope"""
+        return self.shard_for(user_id).save_message(user_id, role, content, scope)
+
+    def record_turn(
+        self,
+        user_id: str,
+        username: str,
+        user_message: str,
+        assistant_message: str,
+        metadata: Optional[Dict] = None
+    ):
+        """Record a whole chat exchange in a single transaction"""
+        return self.shard_for(user_id).record_turn(
+            user_id, username, user_message, assistant_message, metadata
+        )
+
+    def get_conversation_history(
+        self,
+        user_id: str,
+        limit: int = None,
+        token_budget: int = None,
+        scope: str = ""
+    ) -> List[Dict[str, str]]:
+        """Get conversation history for a user"""
+        return self.shard_for(user_id).get_conversation_history(
+            user_id, limit, token_budget, scope
+        )
+
+    def get_conversation_context(
+        self,
+        user_id: str,
+        limit: int = None,
+        token_budget: int = None,
+        scope: str = ""
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict]]:
+        """Get a conversation's summary and the history it does not cover yet"""
+        return self.shard_for(user_id).get_conversation_context(
+            user_id, limit, token_budget, scope
+        )
+
+    def clear_user_history(self, user_id: str, scope: Optional[str] = None):
+        """Clear conversation history for a user in one scope, or in all scopes"""
+        return self.shard_for(user_id).clear_user_history(user_id, scope)
+
+    def get_conversation_summary(self, user_id: str, scope: str = "") -> Optional[Dict]:
+        """Get the rolling summary of a user's older messages in a scope"""
+        return self.shard_for(user_id).get_conversation_summary(user_id, scope)
+
+    def get_messages_to_summarize(
+        self,
+        user_id: str,
+        after_id: int = 0,
+        keep_recent: int = None,
+        limit: int = None,
+        scope: str = ""
+    ) -> List[Dict]:
+        """Get messages not yet covered by the user's summary"""
+        return self.shard_for(user_id).get_messages_to_summarize(
+            user_id, after_id, keep_recent, limit, scope
+        )
+
+    def save_conversation_summary(
+        self,
+        user_id: str,
+        summary: str,
+        last_message_id: int,
+        scope: str = ""
+    ):
+        """Store a user's summary, unless its messages were cleared meanwhile"""
+        return self.shard_for(user_id).save_conversation_summary(
+            user_id, summary, last_message_id, scope
+        )
+
+    def get_user_stats(self, user_id: str) -> Optional[Dict]:
+        """Get statistics for a user"""
+        return self.shard_for(user_id).get_user_stats(user_id)
+
+    # Global operations: fanned out to every shard and merged
+
+    def get_total_stats(self) -> Dict:
+        """Get global bot statistics summed over all shards"""
+        return self._sum_stats([shard.get_total_stats() for shard in self.shards])
+
+    def reconcile_global_stats(self) -> Dict:
+        """Rebuild every shard's global counters and return the totals"""
+        return self._sum_stats(
+            [shard.reconcile_global_stats() for shard in self.shards]
+        )
+
+    @staticmethod
+    def _sum_stats(results: List[Dict]) -> Dict:
+        """Add up per-shard stats dicts key by key"""
+        return {key: sum(result[key] for result in results) for key in results[0]}
+
+    def search_messages(
+        self,
+        query: str,
+        user_id: str = None,
+        limit: int = 20,
+        cursor: str = None
+    ) -> Dict:
+        """
+        Full-text search over all shards, newest first.
+
+        Message ids are only unique within a shard, so each result carries
+        its ``shard`` and the cursor holds one position per shard
+        (comma-separated; empty means not started, 0 means exhausted).
+
+        Args:
+            query: Words to search for; every word must match
+            user_id: Only search this user's messages (a single shard)
+            limit: Maximum number of results per page (capped at 100)
+            cursor: ``next_cursor`` of the previous page
+
+        Returns:
+            Dict with the matching ``results`` and the ``next_cursor``
+        """
+        limit = max(1, min(limit, 100))
+        positions: List[Optional[int]] = [None] * len(self.shards)
+        if cursor:
+            values = cursor.split(",")
+            if len(values) != len(self.shards):
+                raise ValueError("Search cursor does not match the shard count")
+            positions = [int(value) if value else None for value in values]
+
+        if user_id is not None:
+            # Other shards cannot hold this user's messages
+            owner = self.shards.index(self.shard_for(user_id))
+            positions = [
+                position if index == owner else 0
+                for index, position in enumerate(positions)
+            ]
+
+        pages: Dict[int, List[Dict]] = {}
+        more: Dict[int, bool] = {}
+        for index, shard in enumerate(self.shards):
+            if positions[index] == 0:
+                continue
+            page = shard.search_messages(query, user_id, limit, positions[index])
+            pages[index] = [dict(result, shard=index) for result in page["results"]]
+            more[index] = page["next_cursor"] is not None
+
+        # Each shard's page is already newest first; merge them by time
+        merged = heapq.merge(
+            *pages.values(),
+            key=lambda result: (result["timestamp"], result["id"]),
+            reverse=True
+        )
+        results = list(itertools.islice(merged, limit))
+
+        for index, page in pages.items():
+            taken = sum(1 for result in results if result["shard"] == index)
+            if taken < len(page):
+                if taken:
+                    positions[index] = page[taken - 1]["id"]
+            elif more[index]:
+                positions[index] = page[-1]["id"]
+            else:
+                positions[index] = 0
+
+        exhausted = all(position == 0 for position in positions)
+        next_cursor = None if exhausted else ",".join(
+            "" if position is None else str(position) for position in positions
+        )
+        return {"results": results, "next_cursor": next_cursor}
+
+    def get_activity_timeseries(
+        self,
+        start: datetime,
+        end: datetime,
+        step_hours: int = 1,
+        guild_id: str = None
+    ) -> Dict:
+        """Get activity per time step, summed over all shards"""
+        results = [
+            shard.get_activity_timeseries(start, end, step_hours, guild_id)
+            for shard in self.shards
+        ]
+
+        points = []
+        # Users live in a single shard, so hourly unique counts add up
+        # exactly; for wider steps the sum of per-shard busiest hours is an
+        # estimate
+        for shard_points in zip(*(result["points"] for result in results), strict=True):
+            point = {"start": shard_points[0]["start"]}
+            for key in (
+                "messages", "user_messages", "bot_responses",
+                "unique_users", "latency_samples"
+            ):
+                point[key] = sum(p[key] for p in shard_points)
+            latency_total = sum(
+                p["avg_latency_ms"] * p["latency_samples"]
+                for p in shard_points
+                if p["latency_samples"]
+            )
+            samples = point["latency_samples"]
+            point["avg_latency_ms"] = (
+                round(latency_total / samples, 1) if samples else None
+            )
+            points.append(point)
+
+        return {"step_hours": results[0]["step_hours"], "points": points}
+
+    def archive_old_messages(self, policy: RetentionPolicy = None) -> Dict:
+        """Archive messages outside the retention policy on every shard"""
+        results = [shard.archive_old_messages(policy) for shard in self.shards]
+        return self._sum_stats(results)
+
+    def incremental_vacuum_enabled(self) -> bool:
+        """Whether every shard uses incremental auto_vacuum"""
+        return all(shard.incremental_vacuum_enabled() for shard in self.shards)
+
+    def enable_incremental_vacuum(self) -> bool:
+        """Switch every shard to incremental auto_vacuum; True if any changed"""
+        # Convert every shard: any() over a generator would stop at the first
+        changed = [shard.enable_incremental_vacuum() for shard in self.shards]
+        return any(changed)
+
+    def get_cache_stats(self) -> Dict:
+        """Get history cache counters summed over all shards"""
+        stats = self._sum_stats([shard.get_cache_stats() for shard in self.shards])
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+    # Async API: per-user calls run on the owning shard's executor thread
+
+    async def aadd_user(self, user_id: str, username: str):
+        """Async version of add_user"""
+        return await self.shard_for(user_id).aadd_user(user_id, username)
+
+    async def asave_message(
+        self,
+        user_id: str,
+        role: str,
+        content: str,
+        scope: str = ""
+    ):
+        """Async version of save_message"""
+        return await self.shard_for(user_id).asave_message(
+            user_id, role, content, scope
+        )
+
+    async def arecord_turn(
+        self,
+        user_id: str,
+        username: str,
+        user_message: str,
+        assistant_message: str,
+        metadata: Optional[Dict] = None
+    ):
+        """Async version of record_turn"""
+        return await self.shard_for(user_id).arecord_turn(
+            user_id, username, user_message, assistant_message, metadata
+        )
+
+    async def aget_conversation_history(
+        self,
+        user_id: str,
+        limit: int = None,
+        token_budget: int = None,
+        scope: str = ""
+    ) -> List[Dict[str, str]]:
+        """Async version of get_conversation_history"""
+        return await self.shard_for(user_id).aget_conversation_history(
+            user_id, limit, token_budget, scope
+        )
+
+    async def aget_conversation_context(
+        self,
+        user_id: str,
+        limit: int = None,
+        token_budget: int = None,
+        scope: str = ""
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict]]:
+        """Async version of get_conversation_context"""
+        return await self.shard_for(user_id).aget_conversation_context(
+            user_id, limit, token_budget, scope
+        )
+
+    async def aclear_user_history(self, user_id: str, scope: Optional[str] = None):
+        """Async version of clear_user_history"""
+        return await self.shard_for(user_id).aclear_user_history(user_id, scope)
+
+    async def aget_conversation_summary(
+        self,
+        user_id: str,
+        scope: str = ""
+    ) -> Optional[Dict]:
+        """Async version of get_conversation_summary"""
+        return await self.shard_for(user_id).aget_conversation_summary(
+            user_id, scope
+        )
+
+    async def aget_messages_to_summarize(
+        self,
+        user_id: str,
+        after_id: int = 0,
+        keep_recent: int = None,
+        limit: int = None,
+        scope: str = ""
+    ) -> List[Dict]:
+        """Async version of get_messages_to_summarize"""
+        return await self.shard_for(user_id).aget_messages_to_summarize(
+            user_id, after_id, keep_recent, limit, scope
+        )
+
+    async def asave_conversation_summary(
+        self,
+        user_id: str,
+        summary: str,
+        last_message_id: int,
+        scope: str = ""
+    ):
+        """Async version of save_conversation_summary"""
+        return await self.shard_for(user_id).asave_conversation_summary(
+            user_id, summary, last_message_id, scope
+        )
+
+    async def aget_user_stats(self, user_id: str) -> Optional[Dict]:
+        """Async version of get_user_stats"""
+        return await self.shard_for(user_id).aget_user_stats(user_id)
+
+    async def aget_total_stats(self) -> Dict:
+        """Async version of get_total_stats, querying all shards concurrently"""
+        results = await asyncio.gather(
+            *(shard.aget_total_stats() for shard in self.shards)
+        )
+        return self._sum_stats(list(results))
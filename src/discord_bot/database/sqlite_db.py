@@ -1,162 +1,733 @@
 """
 SQLite database management for conversation history and user statistics.
 """
+import atexit
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 from ..config.settings import settings
+from .executor import DatabaseExecutor
+from .history_cache import HistoryCache, HistoryRow, after_summary, fit_history
+from .migrations import apply_migrations, reconcile_global_stats
+from .retention import ArchiveStore, RetentionPolicy
+from .rollups import query_timeseries, update_rollups
+from .write_behind import PendingMessage, WriteBehindQueue
 
 
 class SQLiteDatabase:
-    """SQLite database manager for bot data"""
+    """
+    SQLite database manager for bot data.
 
-    def __init__(self, db_path: str = None):
+    Connections are long-lived: every thread reads through its own pooled
+    connection and all writes go through one dedicated writer connection.
+    The database runs in WAL mode, so readers never block the writer.
+
+    Every public method has an ``a``-prefixed coroutine twin (e.g.
+    ``aget_conversation_history``) that runs it on a dedicated executor
+    thread, so the Discord event loop never waits on disk I/O.
+
+    In write-behind mode messages are buffered and written in group
+    commits; reads for a user with buffered messages flush them first.
+
+    Recent history is served from an in-memory LRU that is kept current
+    by write-through, so active conversations are read without SQLite.
+
+    In read-only mode (used by the admin dashboard and reports) connections
+    are opened with ``mode=ro`` and ``query_only`` from a small bounded
+    pool of their own, and every write method raises.
+    """
+
+    def __init__(
+        self,
+        db_path: str = None,
+        write_behind: bool = None,
+        read_only: bool = False,
+        archive_path: str = None
+    ):
         self.db_path = db_path or settings.SQLITE_DB_PATH
+        self.archive_path = archive_path or settings.SQLITE_ARCHIVE_PATH
+        self.read_only = read_only
+        self.write_behind = not read_only and (
+            settings.SQLITE_WRITE_BEHIND if write_behind is None else write_behind
+        )
+        self._readers: Dict[int, sqlite3.Connection] = {}
+        self._idle_readers: List[sqlite3.Connection] = []
+        self._reader_slots = threading.BoundedSemaphore(
+            settings.SQLITE_READONLY_POOL_SIZE
+        )
+        self._writer: Optional[sqlite3.Connection] = None
+        self._pool_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._executor: Optional[DatabaseExecutor] = None
+        self._write_queue: Optional[WriteBehindQueue] = None
+        # A read-only handle never sees the writes, so it could never keep a
+        # cache current; a zero-size cache makes every read go to disk
+        self._history_cache = HistoryCache(max_users=0) if read_only else HistoryCache()
+        # Only a found index is remembered: a read-only handle may open the
+        # file before the writer has migrated it
+        self._fts_available = False
+
+        if self.write_behind:
+            # Buffered messages must reach disk even if the bot thread is killed
+            atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with the tuned pragmas applied"""
+        if self.read_only:
+            database, uri = f"{Path(self.db_path).resolve().as_uri()}?mode=ro", True
+        else:
+            database, uri = self.db_path, False
+
+        conn = sqlite3.connect(
+            database,
+            timeout=settings.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=settings.SQLITE_STATEMENT_CACHE_SIZE,
+            uri=uri
+        )
+        if self.read_only:
+            conn.execute("PRAGMA query_only = ON")
+        else:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        conn.execute(f"PRAGMA cache_size = -{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        conn.execute(f"PRAGMA mmap_size = {int(settings.SQLITE_MMAP_SIZE)}")
+        return conn
 
     def _get_connection(self) -> sqlite3.Connection:
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+        """Get the calling thread's read connection, opening it on first use"""
+        ident = threading.get_ident()
+        conn = self._readers.get(ident)
+        if conn is None:
+            conn = self._connect()
+            with self._pool_lock:
+                self._prune_readers()
+                self._readers[ident] = conn
+        return conn
+
+    def _prune_readers(self):
+        """Close read connections owned by threads that have exited"""
+        alive = {thread.ident for thread in threading.enumerate()}
+        for ident in list(self._readers):
+            if ident not in alive:
+                self._readers.pop(ident).close()
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Cursor]:
+        """Yield a cursor on a read connection"""
+        conn = self._acquire_reader() if self.read_only else self._get_connection()
 
-    def init_database(self):
-        """Initialize the database and create necessary tables"""
-        conn = self._get_connection()
         cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            if self.read_only:
+                self._release_reader(conn)
 
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id TEXT PRIMARY KEY,
-                username TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
+    def _acquire_reader(self) -> sqlite3.Connection:
+        """Check out a read-only connection, waiting while the pool is exhausted"""
+        self._reader_slots.acquire()
+        try:
+            with self._pool_lock:
+                if self._idle_readers:
+                    # LIFO: the most recently used connection has the warmest cache
+                    return self._idle_readers.pop()
+            return self._connect()
+        except BaseException:
+            self._reader_slots.release()
+            raise
 
-        # Messages table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id TEXT NOT NULL,
-                role TEXT NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
+    def _release_reader(self, conn: sqlite3.Connection):
+        """Return a read-only connection to the pool"""
+        with self._pool_lock:
+            self._idle_readers.append(conn)
+        self._reader_slots.release()
 
-        # Stats table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS stats (
-                user_id TEXT PRIMARY KEY,
-                message_count INTEGER DEFAULT 0,
-                last_interaction TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(user_id)
-            )
-        """)
+    def _get_writer(self) -> sqlite3.Connection:
+        """Get the writer connection; callers must hold the write lock"""
+        if self.read_only:
+            raise RuntimeError(f"Database {self.db_path} is opened read-only")
+        if self._writer is None:
+            self._writer = self._connect()
+        return self._writer
 
-        conn.commit()
-        conn.close()
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        """Run a block of writes on the writer connection as one transaction"""
+        with self._write_lock:
+            conn = self._get_writer()
+            cursor = conn.cursor()
+            try:
+                yield cursor
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def _get_executor(self) -> DatabaseExecutor:
+        """Get the executor thread used by the async API, starting it on first use"""
+        with self._pool_lock:
+            if self._executor is None:
+                self._executor = DatabaseExecutor()
+            return self._executor
+
+    def _get_write_queue(self) -> WriteBehindQueue:
+        """Get the write-behind buffer, starting its flusher on first use"""
+        with self._pool_lock:
+            if self._write_queue is None:
+                self._write_queue = WriteBehindQueue(self._flush_messages)
+            return self._write_queue
+
+    def _flush_pending(self, user_id: Optional[str] = None):
+        """Flush buffered messages (for one user, or all) before a read"""
+        queue = self._write_queue
+        if queue is not None and queue.has_pending(user_id):
+            queue.flush()
+
+    def flush(self):
+        """Write every buffered message to disk now"""
+        self._flush_pending()
+
+    def close(self):
+        """
+        Stop the executor and close all pooled connections.
+
+        Both are recreated lazily on next use, so the bot can be restarted.
+        """
+        with self._pool_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+        with self._pool_lock:
+            write_queue, self._write_queue = self._write_queue, None
+        if write_queue is not None:
+            write_queue.close()
+
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+        with self._pool_lock:
+            for conn in [*self._readers.values(), *self._idle_readers]:
+                conn.close()
+            self._readers.clear()
+            self._idle_readers.clear()
+
+    def init_database(self):
+        """Initialize the database and apply pending schema migrations"""
+        with self._write_lock:
+            applied = apply_migrations(self._get_writer())
+
+        for migration in applied:
+            print(f"🔧 Applied migration {migration.version:03d}: {migration.name}")
         print(f"✅ SQLite database initialized: {self.db_path}")
 
     def add_user(self, user_id: str, username: str):
         """Add or update a user in the database"""
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
+            with self._transaction() as cursor:
+                cursor.execute("""
+                    INSERT INTO users (user_id, username)
+                    VALUES (?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET username = excluded.username
+                """, (user_id, username))
 
-            cursor.execute("""
+                cursor.execute("""
+                    INSERT OR IGNORE INTO stats
+                        (user_id, message_count, last_interaction)
+                    VALUES (?, 0, ?)
+                """, (user_id, datetime.now()))
+        except sqlite3.Error as e:
+            print(f"Error adding user {user_id}: {e}")
+
+    def save_message(self, user_id: str, role: str, content: str, scope: str = ""):
+        """Save a message to the conversation history of a user in a scope"""
+        message = PendingMessage.create(user_id, role, content, scope)
+
+        if self.write_behind:
+            self._get_write_queue().enqueue(message)
+        else:
+            self._flush_messages([message])
+
+        self._history_cache.append(
+            (user_id, scope), (None, role, content, message.token_count)
+        )
+
+    def record_turn(
+        self,
+        user_id: str,
+        username: str,
+        user_message: str,
+        assistant_message: str,
+        metadata: Optional[Dict] = None
+    ):
+        """
+        Record a whole chat exchange in a single transaction.
+
+        Upserts the user and writes both messages and the stats update with
+        one commit, instead of one commit each for ``add_user`` and two
+        ``save_message`` calls.
+
+        Args:
+            user_id: User who sent the message
+            username: Current display name of the user
+            user_message: The user's message
+            assistant_message: The bot's reply
+            metadata: Optional turn details: ``scope`` (conversation scope),
+                ``guild_id`` and ``latency_ms`` (reply time, for the rollups)
+        """
+        metadata = metadata or {}
+        scope = metadata.get("scope", "")
+        guild_id = metadata.get("guild_id")
+
+        messages = [
+            PendingMessage.create(
+                user_id, "user", user_message, scope, username, guild_id
+            ),
+            PendingMessage.create(
+                user_id, "assistant", assistant_message, scope,
+                guild_id=guild_id, latency_ms=metadata.get("latency_ms")
+            )
+        ]
+
+        if self.write_behind:
+            queue = self._get_write_queue()
+            for message in messages:
+                queue.enqueue(message)
+        else:
+            self._flush_messages(messages)
+
+        for message in messages:
+            self._history_cache.append(
+                (user_id, scope),
+                (None, message.role, message.content, message.token_count)
+            )
+
+    def _flush_messages(self, messages: List[PendingMessage]):
+        """Write messages and their stats updates in one transaction"""
+        with self._transaction() as cursor:
+            self._write_messages(cursor, messages)
+
+    @staticmethod
+    def _write_messages(cursor: sqlite3.Cursor, messages: List[PendingMessage]):
+        """Insert messages and update per-user stats on an open transaction"""
+        users = {m.user_id: m.username for m in messages if m.username is not None}
+        if users:
+            cursor.executemany("""
                 INSERT INTO users (user_id, username)
                 VALUES (?, ?)
                 ON CONFLICT(user_id) DO UPDATE SET username = excluded.username
-            """, (user_id, username))
-
-            cursor.execute("""
+            """, users.items())
+            cursor.executemany("""
                 INSERT OR IGNORE INTO stats (user_id, message_count, last_interaction)
                 VALUES (?, 0, ?)
-            """, (user_id, datetime.now()))
-
-            conn.commit()
-            conn.close()
-        except sqlite3.Error as e:
-            print(f"Error adding user {user_id}: {e}")
-            if conn:
-                conn.close()
+            """, [(user_id, datetime.now()) for user_id in users])
 
-    def save_message(self, user_id: str, role: str, content: str):
-        """Save a message to the conversation history"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        cursor.executemany("""
+            INSERT INTO messages (user_id, scope, role, content, timestamp, token_count)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (
+                m.user_id, m.scope, m.role, m.content,
+                m.created_at.strftime("%Y-%m-%d %H:%M:%S"), m.token_count
+            )
+            for m in messages
+        ])
 
-        cursor.execute("""
-            INSERT INTO messages (user_id, role, content)
-            VALUES (?, ?, ?)
-        """, (user_id, role, content))
+        # One stats update per user, however many of their messages are in the batch
+        stats: Dict[str, List] = {}
+        for m in messages:
+            entry = stats.setdefault(m.user_id, [0, None])
+            entry[0] += 1
+            entry[1] = m.created_at.astimezone().replace(tzinfo=None)
 
-        cursor.execute("""
+        cursor.executemany("""
             UPDATE stats
-            SET message_count = message_count + 1,
+            SET message_count = message_count + ?,
                 last_interaction = ?
             WHERE user_id = ?
-        """, (datetime.now(), user_id))
+        """, [(count, last, user_id) for user_id, (count, last) in stats.items()])
+
+        update_rollups(cursor, messages)
+
+    def get_conversation_history(
+        self,
+        user_id: str,
+        limit: int = None,
+        token_budget: int = None,
+        scope: str = ""
+    ) -> List[Dict[str, str]]:
+        """
+        Get conversation history for a user.
 
-        conn.commit()
-        conn.close()
+        Args:
+            user_id: User whose history to read
+            limit: Maximum number of messages
+            token_budget: If set, return only the newest messages whose
+                precomputed token counts fit within this many tokens
+            scope: Conversation scope (e.g. "dm" or "guild:<id>")
 
-    def get_conversation_history(self, user_id: str, limit: int = None) -> List[Dict[str, str]]:
-        """Get conversation history for a user"""
+        Returns:
+            Messages in chronological order
+        """
         if limit is None:
-            limit = settings.CONVERSATION_HISTORY_LIMIT
+            if token_budget is None:
+                limit = settings.CONVERSATION_HISTORY_LIMIT
+            else:
+                limit = settings.HISTORY_MAX_MESSAGES
 
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        history = self._history_cache.get((user_id, scope), limit, token_budget)
+        if history is not None:
+            return history
 
-        cursor.execute("""
-            SELECT role, content
-            FROM messages
-            WHERE user_id = ?
-            ORDER BY timestamp DESC
-            LIMIT ?
-        """, (user_id, limit))
+        # Read a full cache window so later, longer requests can hit too
+        rows, _ = self._load_history(
+            user_id, scope, max(limit, self._history_cache.window)
+        )
+        history, _ = fit_history(rows, limit, token_budget)
+        return history
+
+    def get_conversation_context(
+        self,
+        user_id: str,
+        limit: int = None,
+        token_budget: int = None,
+        scope: str = ""
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict]]:
+        """
+        Get a conversation's summary and the history it does not cover yet.
+
+        Messages folded into the summary are left out, so no turn is sent
+        both raw and summarized. Both come from the history cache when the
+        conversation is cached.
+
+        Args:
+            user_id: User whose conversation to read
+            limit: Maximum number of messages
+            token_budget: If set, return only the newest messages whose
+                precomputed token counts fit within this many tokens
+            scope: Conversation scope
+
+        Returns:
+            Messages in chronological order, and the summary (or None)
+        """
+        if limit is None:
+            limit = (
+                settings.CONVERSATION_HISTORY_LIMIT if token_budget is None
+                else settings.HISTORY_MAX_MESSAGES
+            )
+
+        context = self._history_cache.get_context((user_id, scope), limit, token_budget)
+        if context is not None:
+            return context
+
+        rows, summary = self._load_history(
+            user_id, scope, max(limit, self._history_cache.window)
+        )
+        history, _ = fit_history(after_summary(rows, summary)[0], limit, token_budget)
+        return history, summary
+
+    def _load_history(
+        self,
+        user_id: str,
+        scope: str,
+        limit: int
+    ) -> Tuple[List[HistoryRow], Optional[Dict]]:
+        """Read a conversation's newest messages and summary from disk and cache them"""
+        self._flush_pending(user_id)
 
-        messages = cursor.fetchall()
-        conn.close()
+        generation = self._history_cache.generation
+
+        with self._reader() as cursor:
+            cursor.execute("""
+                SELECT id, role, content, token_count
+                FROM messages
+                WHERE user_id = ? AND scope = ?
+                ORDER BY id DESC
+                LIMIT ?
+            """, (user_id, scope, limit))
+            rows = cursor.fetchall()
+
+            cursor.execute("""
+                SELECT summary, last_message_id
+                FROM conversation_summaries
+                WHERE user_id = ? AND scope = ?
+            """, (user_id, scope))
+            row = cursor.fetchone()
+
+        summary = {"summary": row[0], "last_message_id": row[1]} if row else None
 
         # Reverse to get chronological order
-        history = []
-        for role, content in reversed(messages):
-            history.append({"role": role, "content": content})
+        rows.reverse()
+        self._history_cache.populate(
+            (user_id, scope), rows, len(rows) < limit, generation, summary
+        )
 
-        return history
+        return rows, summary
 
-    def clear_user_history(self, user_id: str):
-        """Clear conversation history for a user"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def clear_user_history(self, user_id: str, scope: Optional[str] = None):
+        """Clear conversation history for a user in one scope, or in all scopes"""
+        self._flush_pending(user_id)
 
-        cursor.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
-        cursor.execute("""
-            UPDATE stats
-            SET message_count = 0
-            WHERE user_id = ?
-        """, (user_id,))
+        with self._transaction() as cursor:
+            if scope is None:
+                cursor.execute("DELETE FROM messages WHERE user_id = ?", (user_id,))
+                cursor.execute(
+                    "DELETE FROM conversation_summaries WHERE user_id = ?", (user_id,)
+                )
+                cursor.execute("""
+                    UPDATE stats
+                    SET message_count = 0
+                    WHERE user_id = ?
+                """, (user_id,))
+            else:
+                cursor.execute(
+                    "DELETE FROM messages WHERE user_id = ? AND scope = ?",
+                    (user_id, scope)
+                )
+                deleted = cursor.rowcount
+                cursor.execute("""
+                    DELETE FROM conversation_summaries
+                    WHERE user_id = ? AND scope = ?
+                """, (user_id, scope))
+                cursor.execute("""
+                    UPDATE stats
+                    SET message_count = MAX(message_count - ?, 0)
+                    WHERE user_id = ?
+                """, (deleted, user_id))
+
+        if scope is None:
+            self._history_cache.invalidate_user(user_id)
+        else:
+            self._history_cache.reset((user_id, scope))
 
-        conn.commit()
-        conn.close()
+    def get_meta(self, key: str) -> Optional[str]:
+        """Get a value stored about the database file, e.g. its shard layout"""
+        with self._reader() as cursor:
+            cursor.execute("SELECT value FROM database_meta WHERE key = ?", (key,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str):
+        """Store a value about the database file"""
+        with self._transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO database_meta (key, value) VALUES (?, ?)
+                ON CONFLICT(key) DO UPDATE SET value = excluded.value
+            """, (key, value))
+
+    def get_conversation_summary(self, user_id: str, scope: str = "") -> Optional[Dict]:
+        """Get the rolling summary of a user's older messages in a scope"""
+        with self._reader() as cursor:
+            cursor.execute("""
+                SELECT summary, last_message_id
+                FROM conversation_summaries
+                WHERE user_id = ? AND scope = ?
+            """, (user_id, scope))
+
+            result = cursor.fetchone()
+
+        if result:
+            return {"summary": result[0], "last_message_id": result[1]}
+        return None
+
+    def get_messages_to_summarize(
+        self,
+        user_id: str,
+        after_id: int = 0,
+        keep_recent: int = None,
+        limit: int = None,
+        scope: str = ""
+    ) -> List[Dict]:
+        """
+        Get messages not yet covered by the user's summary.
+
+        Args:
+            user_id: User whose messages to read
+            after_id: Last message id already summarized
+            keep_recent: Newest messages to leave out (they are sent raw)
+            limit: Maximum number of messages
+            scope: Conversation scope
+
+        Returns:
+            Messages with their ids, in chronological order
+        """
+        if keep_recent is None:
+            keep_recent = settings.SUMMARY_KEEP_RECENT
+        if limit is None:
+            limit = settings.SUMMARY_MAX_MESSAGES
+
+        self._flush_pending(user_id)
+
+        with self._reader() as cursor:
+            cursor.execute("""
+                SELECT id, role, content
+                FROM messages
+                WHERE user_id = ? AND scope = ?
+                  AND id > ?
+                  AND id < (
+                      SELECT id FROM messages
+                      WHERE user_id = ? AND scope = ?
+                      ORDER BY id DESC
+                      LIMIT 1 OFFSET ?
+                  )
+                ORDER BY id
+                LIMIT ?
+            """, (
+                user_id, scope, after_id,
+                user_id, scope, max(keep_recent - 1, 0),
+                limit
+            ))
+
+            rows = cursor.fetchall()
+
+        return [
+            {"id": msg_id, "role": role, "content": content}
+            for msg_id, role, content in rows
+        ]
+
+    def save_conversation_summary(
+        self,
+        user_id: str,
+        summary: str,
+        last_message_id: int,
+        scope: str = ""
+    ):
+        """Store a user's summary, unless its messages were cleared meanwhile"""
+        with self._transaction() as cursor:
+            cursor.execute("""
+                INSERT INTO conversation_summaries
+                    (user_id, scope, summary, last_message_id, updated_at)
+                SELECT ?, ?, ?, ?, CURRENT_TIMESTAMP
+                WHERE EXISTS (SELECT 1 FROM messages WHERE id = ? AND user_id = ?)
+                ON CONFLICT(user_id, scope) DO UPDATE SET
+                    summary = excluded.summary,
+                    last_message_id = excluded.last_message_id,
+                    updated_at = excluded.updated_at
+            """, (user_id, scope, summary, last_message_id, last_message_id, user_id))
+
+        # Cached messages written since being cached have no id to compare
+        # with the new cutoff: reload the conversation on the next read
+        self._history_cache.invalidate((user_id, scope))
+
+    def search_messages(
+        self,
+        query: str,
+        user_id: str = None,
+        limit: int = 20,
+        cursor: Union[int, str] = None
+    ) -> Dict:
+        """
+        Full-text search over stored messages, newest first.
+
+        Args:
+            query: Words to search for; every word must match
+            user_id: Only search this user's messages
+            limit: Maximum number of results per page (capped at 100)
+            cursor: ``next_cursor`` of the previous page
+
+        Returns:
+            Dict with the matching ``results`` and the ``next_cursor`` to
+            pass for the following page (None on the last page)
+        """
+        terms = query.split()
+        limit = max(1, min(limit, 100))
+        if not terms:
+            return {"results": [], "next_cursor": None}
+
+        self._flush_pending(user_id)
+
+        with self._reader() as db_cursor:
+            use_fts = self._has_search_index(db_cursor)
+
+            filters, params = [], []
+            if user_id is not None:
+                filters.append("m.user_id = ?")
+                params.append(user_id)
+            if cursor is not None:
+                # Keyset pagination: cheap at any depth, unlike OFFSET
+                filters.append("messages_fts.rowid < ?" if use_fts else "m.id < ?")
+                params.append(int(cursor))
+
+            if use_fts:
+                # Quote every term so user input is never parsed as FTS syntax
+                match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+                where = " AND ".join(["messages_fts MATCH ?", *filters])
+                db_cursor.execute(f"""
+                    SELECT m.id, m.user_id, m.scope, m.role, m.timestamp,
+                           snippet(messages_fts, 0, '[', ']', '…', 16)
+                    FROM messages_fts
+                    JOIN messages m ON m.id = messages_fts.rowid
+                    WHERE {where}
+                    ORDER BY messages_fts.rowid DESC
+                    LIMIT ?
+                """, [match, *params, limit + 1])
+            else:
+                escaped = (
+                    term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                    for term in terms
+                )
+                patterns = ["%" + term + "%" for term in escaped]
+                like = ["m.content LIKE ? ESCAPE '\\'"] * len(terms)
+                where = " AND ".join(like + filters)
+                db_cursor.execute(f"""
+                    SELECT m.id, m.user_id, m.scope, m.role, m.timestamp,
+                           substr(m.content, 1, 200)
+                    FROM messages m
+                    WHERE {where}
+                    ORDER BY m.id DESC
+                    LIMIT ?
+                """, [*patterns, *params, limit + 1])
+
+            rows = db_cursor.fetchall()
+
+        results = [
+            {
+                "id": row[0],
+                "user_id": row[1],
+                "scope": row[2],
+                "role": row[3],
+                "timestamp": row[4],
+                "snippet": row[5]
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = results[-1]["id"] if len(rows) > limit else None
+        return {"results": results, "next_cursor": next_cursor}
+
+    def _has_search_index(self, cursor: sqlite3.Cursor) -> bool:
+        """Check whether the FTS5 message index was created"""
+        if not self._fts_available:
+            cursor.execute("""
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'table' AND name = 'messages_fts'
+            """)
+            self._fts_available = cursor.fetchone() is not None
+        return self._fts_available
 
     def get_user_stats(self, user_id: str) -> Optional[Dict]:
         """Get statistics for a user"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        self._flush_pending(user_id)
 
-        cursor.execute("""
-            SELECT u.username, s.message_count, s.last_interaction
-            FROM users u
-            LEFT JOIN stats s ON u.user_id = s.user_id
-            WHERE u.user_id = ?
-        """, (user_id,))
+        with self._reader() as cursor:
+            cursor.execute("""
+                SELECT u.username, s.message_count, s.last_interaction
+                FROM users u
+                LEFT JOIN stats s ON u.user_id = s.user_id
+                WHERE u.user_id = ?
+            """, (user_id,))
 
-        result = cursor.fetchone()
-        conn.close()
+            result = cursor.fetchone()
 
         if result:
             return {
@@ -168,27 +739,310 @@ class SQLiteDatabase:
 
     def get_total_stats(self) -> Dict:
         """Get global bot statistics"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        self._flush_pending()
+
+        with self._reader() as cursor:
+            try:
+                # O(1): counters are maintained by triggers on users and messages
+                cursor.execute("SELECT name, value FROM global_stats")
+                counters = dict(cursor.fetchall())
+            except sqlite3.OperationalError as e:
+                if "no such table" not in str(e):
+                    raise
+                # Not migrated yet (e.g. a read-only handle on an old file)
+                counters = self._count_total_stats(cursor)
 
+        return self._format_total_stats(counters)
+
+    @staticmethod
+    def _count_total_stats(cursor: sqlite3.Cursor) -> Dict[str, int]:
+        """Count the global stats with full table scans"""
         cursor.execute("SELECT COUNT(*) FROM users")
         total_users = cursor.fetchone()[0]
 
-        cursor.execute("SELECT COUNT(*) FROM messages")
-        total_messages = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT COUNT(*), COALESCE(SUM(role = 'user'), 0) FROM messages
+        """)
+        total_messages, user_messages = cursor.fetchone()
+
+        return {
+            "total_users": total_users,
+            "total_messages": total_messages,
+            "user_messages": user_messages
+        }
 
-        cursor.execute("SELECT COUNT(*) FROM messages WHERE role = 'user'")
-        user_messages = cursor.fetchone()[0]
+    def reconcile_global_stats(self) -> Dict:
+        """Rebuild the global counters from a full count of users and messages"""
+        self._flush_pending()
 
-        conn.close()
+        with self._transaction() as cursor:
+            reconcile_global_stats(cursor)
+            cursor.execute("SELECT name, value FROM global_stats")
+            counters = dict(cursor.fetchall())
+
+        return self._format_total_stats(counters)
+
+    @staticmethod
+    def _format_total_stats(counters: Dict[str, int]) -> Dict:
+        """Shape raw global_stats counters into the stats dict"""
+        total_messages = counters.get("total_messages", 0)
+        user_messages = counters.get("user_messages", 0)
 
         return {
-            "total_users": total_users,
+            "total_users": counters.get("total_users", 0),
             "total_messages": total_messages,
             "user_messages": user_messages,
             "bot_responses": total_messages - user_messages
         }
 
+    def get_activity_timeseries(
+        self,
+        start: datetime,
+        end: datetime,
+        step_hours: int = 1,
+        guild_id: str = None
+    ) -> Dict:
+        """
+        Get activity per time step from the hourly rollups.
+
+        Reads at most one rollup row per hour in range, however many
+        messages were sent.
+
+        Args:
+            start: Start of the range (naive UTC)
+            end: End of the range (naive UTC, exclusive)
+            step_hours: Hours per point; widened to cap the number of points
+            guild_id: Only count this guild's activity
+
+        Returns:
+            Dict with the effective ``step_hours`` and the ``points``
+        """
+        self._flush_pending()
+
+        with self._reader() as cursor:
+            return query_timeseries(cursor, start, end, step_hours, guild_id)
+
+    def archive_old_messages(self, policy: RetentionPolicy = None) -> Dict:
+        """
+        Move messages outside the retention policy to the archive database.
+
+        Works in bounded batches: each batch is committed to the archive
+        before it is deleted here, so the write lock is only held briefly
+        and an interrupted run never loses messages. Freed pages are then
+        returned to the filesystem with an incremental vacuum, if the
+        database has incremental auto_vacuum enabled.
+
+        Args:
+            policy: Retention rules; defaults to the configured policy
+
+        Returns:
+            Number of messages archived and database pages freed
+        """
+        policy = policy or RetentionPolicy()
+        if not policy.enabled:
+            return {"archived": 0, "freed_pages": 0}
+
+        self._flush_pending()
+
+        archive = ArchiveStore(self.archive_path)
+        archived = 0
+        policy.reset()
+        try:
+            while True:
+                with self._reader() as cursor:
+                    rows = policy.expired_batch(cursor)
+                if not rows:
+                    break
+
+                ids_by_user: Dict[str, List] = {}
+                for row in rows:
+                    ids_by_user.setdefault(row[1], []).append((row[0],))
+
+                archive.store(rows)
+                with self._transaction() as cursor:
+                    # The triggers keep global_stats in step; the per-user
+                    # counts are lowered by the rows actually deleted
+                    for user_id, ids in ids_by_user.items():
+                        cursor.executemany("DELETE FROM messages WHERE id = ?", ids)
+                        cursor.execute("""
+                            UPDATE stats
+                            SET message_count = MAX(message_count - ?, 0)
+                            WHERE user_id = ?
+                        """, (cursor.rowcount, user_id))
+
+                for user_id, scope in {(row[1], row[5]) for row in rows}:
+                    self._history_cache.invalidate((user_id, scope))
+                archived += len(rows)
+        finally:
+            archive.close()
+
+        return {"archived": archived, "freed_pages": self._incremental_vacuum()}
+
+    def incremental_vacuum_enabled(self) -> bool:
+        """Whether the database uses incremental auto_vacuum"""
+        with self._reader() as cursor:
+            cursor.execute("PRAGMA auto_vacuum")
+            return cursor.fetchone()[0] == 2
+
+    def enable_incremental_vacuum(self) -> bool:
+        """
+        Switch an existing database to incremental auto_vacuum.
+
+        This needs a full VACUUM, which rewrites the whole file and blocks
+        every write meanwhile, so it is only done on request (e.g. from the
+        ``archive_messages --vacuum`` management command). Databases created
+        by the migrations already use incremental auto_vacuum.
+
+        Returns:
+            True if the database was converted, False if it already was
+        """
+        self._flush_pending()
+        with self._write_lock:
+            conn = self._get_writer()
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                return False
+
+            print(
+                f"🧹 Enabling incremental auto_vacuum on {self.db_path} "
+                "(full VACUUM)..."
+            )
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+        return True
+
+    def _incremental_vacuum(self) -> int:
+        """Release free pages to the filesystem, returning how many were freed"""
+        with self._write_lock:
+            conn = self._get_writer()
+
+            # Without incremental auto_vacuum free pages are simply reused
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return 0
+
+            free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            conn.execute("PRAGMA incremental_vacuum").fetchall()
+            free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        return free_before - free_after
+
+    def get_cache_stats(self) -> Dict:
+        """Get size and hit/miss counters of the history cache"""
+        return self._history_cache.stats()
+
+    # Async API: same operations, run on the executor thread
+
+    async def aadd_user(self, user_id: str, username: str):
+        """Async version of add_user"""
+        return await self._get_executor().run(self.add_user, user_id, username)
+
+    async def asave_message(
+        self,
+        user_id: str,
+        role: str,
+        content: str,
+        scope: str = ""
+    ):
+        """Async version of save_message"""
+        return await self._get_executor().run(
+            self.save_message, user_id, role, content, scope
+        )
+
+    async def arecord_turn(
+        self,
+        user_id: str,
+        username: str,
+        user_message: str,
+        assistant_message: str,
+        metadata: Optional[Dict] = None
+    ):
+        """Async version of record_turn"""
+        return await self._get_executor().run(
+            self.record_turn,
+            user_id, username, user_message, assistant_message, metadata
+        )
+
+    async def aget_conversation_history(
+        self,
+        user_id: str,
+        limit: int = None,
+        token_budget: int = None,
+        scope: str = ""
+    ) -> List[Dict[str, str]]:
+        """Async version of get_conversation_history"""
+        return await self._get_executor().run(
+            self.get_conversation_history, user_id, limit, token_budget, scope
+        )
+
+    async def aget_conversation_context(
+        self,
+        user_id: str,
+        limit: int = None,
+        token_budget: int = None,
+        scope: str = ""
+    ) -> Tuple[List[Dict[str, str]], Optional[Dict]]:
+        """Async version of get_conversation_context"""
+        return await self._get_executor().run(
+            self.get_conversation_context, user_id, limit, token_budget, scope
+        )
+
+    async def aclear_user_history(self, user_id: str, scope: Optional[str] = None):
+        """Async version of clear_user_history"""
+        return await self._get_executor().run(self.clear_user_history, user_id, scope)
+
+    async def aget_conversation_summary(
+        self,
+        user_id: str,
+        scope: str = ""
+    ) -> Optional[Dict]:
+        """Async version of get_conversation_summary"""
+        return await self._get_executor().run(
+            self.get_conversation_summary, user_id, scope
+        )
+
+    async def aget_messages_to_summarize(
+        self,
+        user_id: str,
+        after_id: int = 0,
+        keep_recent: int = None,
+        limit: int = None,
+        scope: str = ""
+    ) -> List[Dict]:
+        """Async version of get_messages_to_summarize"""
+        return await self._get_executor().run(
+            self.get_messages_to_summarize, user_id, after_id, keep_recent, limit, scope
+        )
+
+    async def asave_conversation_summary(
+        self,
+        user_id: str,
+        summary: str,
+        last_message_id: int,
+        scope: str = ""
+    ):
+        """Async version of save_conversation_summary"""
+        return await self._get_executor().run(
+            self.save_conversation_summary, user_id, summary, last_message_id, scope
+        )
+
+    async def aget_user_stats(self, user_id: str) -> Optional[Dict]:
+        """Async version of get_user_stats"""
+        return await self._get_executor().run(self.get_user_stats, user_id)
+
+    async def aget_total_stats(self) -> Dict:
+        """Async version of get_total_stats"""
+        return await self._get_executor().run(self.get_total_stats)
+
+
+def create_database(read_only: bool = False):
+    """Create the configured database: sharded when SQLITE_SHARD_COUNT > 1"""
+    if settings.SQLITE_SHARD_COUNT > 1:
+        # Imported here: sharded_db builds on SQLiteDatabase from this module
+        from .sharded_db import ShardedDatabase
+        return ShardedDatabase(read_only=read_only)
+    return SQLiteDatabase(read_only=read_only)
+
 
-# Singleton instance
-db = SQLiteDatabase()
+# Singleton instances
+db = create_database()
+# For the admin dashboard and reports, so their queries never contend with bot writes
+readonly_db = create_database(read_only=True)
@@ -0,0 +1,201 @@
+"""
+Write-behind buffer that groups message writes into batched commits.
+"""
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Callable, List, NamedTuple, Optional, Tuple
+
+from ..config.settings import settings
+from ..utils.logging_config import logger as bot_logger
+from ..utils.tokens import estimate_message_tokens
+
+
+class PendingMessage(NamedTuple):
+    """A message waiting to be written to the messages table"""
+
+    user_id: str
+    role: str
+    content: str
+    created_at: datetime
+    token_count: int
+    scope: str
+    # Set to upsert the user in the same transaction as the message
+    username: Optional[str] = None
+    # Guild the message was sent in, for the per-guild activity rollups
+    guild_id: Optional[str] = None
+    # Time the bot took to produce this reply
+    latency_ms: Optional[float] = None
+
+    @classmethod
+    def create(
+        cls,
+        user_id: str,
+        role: str,
+        content: str,
+        scope: str = "",
+        username: Optional[str] = None,
+        guild_id: Optional[str] = None,
+        latency_ms: Optional[float] = None
+    ) -> "PendingMessage":
+        """Build a message stamped with the current time and its token estimate"""
+        return cls(
+            user_id, role, content, datetime.now(timezone.utc),
+            estimate_message_tokens(content), scope, username, guild_id, latency_ms
+        )
+
+
+class WriteBehindQueue:
+    """
+    Buffers message writes and flushes them in group commits.
+
+    A background thread flushes the buffer every ``interval_ms`` or as soon
+    as ``batch_size`` messages are pending, so a burst of messages costs one
+    transaction (and one fsync) instead of one per message.
+
+    A batch that fails to commit is retried on the following flushes, ahead
+    of newer messages. After ``max_attempts`` failures its messages are
+    written one by one and those that still fail are dropped, so a single
+    bad row cannot stall the queue. Once ``max_pending`` messages are
+    unwritten, ``enqueue`` blocks until the flusher catches up.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[PendingMessage]], None],
+        interval_ms: int = None,
+        batch_size: int = None,
+        max_attempts: int = None,
+        max_pending: int = None
+    ):
+        self._flush_fn = flush_fn
+        self.interval = (interval_ms or settings.SQLITE_WRITE_BEHIND_INTERVAL_MS) / 1000
+        self.batch_size = batch_size or settings.SQLITE_WRITE_BEHIND_BATCH_SIZE
+        self.max_attempts = max_attempts or settings.SQLITE_WRITE_BEHIND_MAX_ATTEMPTS
+        self.max_pending = max_pending or settings.SQLITE_WRITE_BEHIND_MAX_PENDING
+
+        self._pending: List[PendingMessage] = []
+        # Batch that failed to commit, and how many times it has failed
+        self._failed: Optional[Tuple[List[PendingMessage], int]] = None
+        # Per-user count of messages not yet durable, including the batch
+        # currently being written, so readers know when they must flush first
+        self._pending_users: Counter = Counter()
+        self._unwritten = 0
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._space = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run, name="sqlite-write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        """Flush periodically until the queue is closed"""
+        while not self._closed:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def enqueue(self, message: PendingMessage):
+        """Buffer a message for the next group commit"""
+        with self._lock:
+            while self._unwritten >= self.max_pending and not self._closed:
+                self._wakeup.set()
+                self._space.wait(self.interval)
+            if self._closed:
+                raise RuntimeError("Write-behind queue has been closed")
+            self._pending.append(message)
+            self._pending_users[message.user_id] += 1
+            self._unwritten += 1
+            batch_full = len(self._pending) >= self.batch_size
+
+        if batch_full:
+            self._wakeup.set()
+
+    def has_pending(self, user_id: Optional[str] = None) -> bool:
+        """Check for unwritten messages, optionally for a single user"""
+        with self._lock:
+            if user_id is None:
+                return bool(self._pending_users)
+            return user_id in self._pending_users
+
+    def flush(self):
+        """
+        Write the buffered messages in a single transaction.
+
+        A previously failed batch goes first, in its own transaction; if it
+        fails again, newer messages wait behind it to keep the write order.
+        """
+        with self._flush_lock:
+            while True:
+                retrying = self._failed is not None
+                if retrying:
+                    batch, attempts = self._failed
+                else:
+                    with self._lock:
+                        batch, self._pending = self._pending, []
+                    attempts = 0
+
+                if not batch:
+                    return
+
+                try:
+                    self._flush_fn(batch)
+                except Exception as e:
+                    attempts += 1
+                    if attempts < self.max_attempts:
+                        self._failed = (batch, attempts)
+                        bot_logger.get_logger().warning(
+                            f"Error flushing {len(batch)} buffered messages "
+                            f"(attempt {attempts}/{self.max_attempts}): {e}"
+                        )
+                        return
+                    self._write_individually(batch, e)
+
+                self._failed = None
+                self._written(batch)
+                if not retrying:
+                    return
+
+    def _write_individually(self, batch: List[PendingMessage], error: Exception):
+        """Write a batch that keeps failing message by message, dropping failures"""
+        bot_logger.get_logger().error(
+            f"Giving up on a batch of {len(batch)} buffered messages after "
+            f"{self.max_attempts} attempts ({error}); writing them one by one"
+        )
+        for message in batch:
+            try:
+                self._flush_fn([message])
+            except Exception as e:
+                self.dropped += 1
+                bot_logger.get_logger().error(
+                    f"Dropped buffered {message.role} message of user "
+                    f"{message.user_id} from {message.created_at.isoformat()}: {e}"
+                )
+
+    def _written(self, batch: List[PendingMessage]):
+        """Stop tracking messages that were written (or dropped)"""
+        with self._lock:
+            self._pending_users.subtract(message.user_id for message in batch)
+            self._pending_users += Counter()  # drop users with no pending rows
+            self._unwritten -= len(batch)
+            self._space.notify_all()
+
+    def close(self):
+        """Stop the flusher thread and write whatever is still buffered"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._space.notify_all()
+
+        self._wakeup.set()
+        if threading.current_thread() is not self._thread:
+            self._thread.join()
+        # Each failing flush uses up an attempt, so this ends
+        while self.has_pending():
+            self.flush()
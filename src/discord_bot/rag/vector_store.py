@@ -5,9 +5,18 @@ import uuid
 from typing import List, Dict, Optional
 
 import chromadb
-from openai import AsyncOpenAI
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI
 
 from ..config.settings import settings
+from ..utils.circuit_breaker import TRANSIENT_STATUSES, get_circuit_breaker
+
+
+def _is_upstream_failure(error: Exception) -> bool:
+    """Whether an OpenAI error points at an unhealthy API rather than a bad request"""
+    if isinstance(error, APIStatusError):
+        return error.status_code in TRANSIENT_STATUSES
+    # Includes timeouts
+    return isinstance(error, APIConnectionError)
 
 
 class VectorStore:
@@ -26,6 +35,7 @@ class VectorStore:
 
         api_key = openai_api_key or settings.OPENAI_API_KEY
         self.openai_client = AsyncOpenAI(api_key=api_key) if api_key else None
+        self._breaker = get_circuit_breaker("openai")
 
     async def get_embedding(self, text: str) -> List[float]:
         """Generate embedding for text using OpenAI"""
@@ -36,13 +46,17 @@ class VectorStore:
             raise Exception("OpenAI client not initialized")
 
         try:
-            response = await self.openai_client.embeddings.create(
-                model=settings.EMBEDDING_MODEL,
-                input=text
+            # Fails fast while OpenAI is down instead of waiting for a timeout
+            response = await self._breaker.call(
+                lambda: self.openai_client.embeddings.create(
+                    model=settings.EMBEDDING_MODEL,
+                    input=text
+                ),
+                is_failure=_is_upstream_failure
             )
             return response.data[0].embedding
         except Exception as e:
-            raise Exception(f"Error generating embedding: {e}")
+            raise Exception(f"Error generating embedding: {e}") from e
 
     def init_vector_db(self):
         """Initialize the vector database"""
@@ -0,0 +1,231 @@
+"""
+Circuit breakers that fail fast while an upstream service is down.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+from ..config.settings import settings
+
+T = TypeVar("T")
+
+# HTTP statuses of a struggling upstream (timeouts, throttling, 5xx) rather
+# than of a rejected request
+TRANSIENT_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit '{name}' is open; retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker for one upstream.
+
+    While closed, calls pass through and their outcomes are kept for
+    ``window`` seconds. Once at least ``min_calls`` outcomes are known and
+    the failure rate reaches ``failure_rate``, the circuit opens: calls
+    fail immediately with ``CircuitOpenError`` for ``open_seconds``. Then
+    it goes half-open and lets ``probes`` calls through; if they succeed
+    the circuit closes, and a failure opens it again.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_rate: float = None,
+        min_calls: int = None,
+        window: float = None,
+        open_seconds: float = None,
+        probes: int = None
+    ):
+        self.name = name
+        if failure_rate is None:
+            failure_rate = settings.CIRCUIT_FAILURE_RATE
+        if min_calls is None:
+            min_calls = settings.CIRCUIT_MIN_CALLS
+        if window is None:
+            window = settings.CIRCUIT_WINDOW_SECONDS
+        if open_seconds is None:
+            open_seconds = settings.CIRCUIT_OPEN_SECONDS
+        if probes is None:
+            probes = settings.CIRCUIT_HALF_OPEN_PROBES
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.open_seconds = open_seconds
+        self.probes = probes
+
+        self._state = CLOSED
+        # (finished_at, ok) of calls while closed
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the wait is over"""
+        with self._lock:
+            return self._current_state()
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        is_failure: Callable[[Exception], bool] = None
+    ) -> T:
+        """
+        Run an upstream call through the breaker.
+
+        Args:
+            fn: Makes the call
+            is_failure: Whether an exception means the upstream is unhealthy
+                (default: every exception); others pass through uncounted,
+                e.g. a rejected request
+
+        Returns:
+            Result of fn
+
+        Raises:
+            CircuitOpenError: If the circuit is open, without calling fn
+        """
+        probe = self._before_call()
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            # Says nothing about the upstream; just free the probe slot
+            self._after_call(probe, None)
+            raise
+        except Exception as e:
+            failed = is_failure(e) if is_failure is not None else True
+            self._after_call(probe, False if failed else None)
+            raise
+        self._after_call(probe, True)
+        return result
+
+    def snapshot(self) -> Dict:
+        """Get the state, recent failure rate and counters"""
+        with self._lock:
+            state = self._current_state()
+            self._prune(time.monotonic())
+            calls = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            retry_in = self._retry_in() if state == OPEN else None
+            return {
+                "state": state,
+                "calls": calls,
+                "failure_rate": failures / calls if calls else 0.0,
+                "retry_in_seconds": (
+                    round(retry_in, 1) if retry_in is not None else None
+                ),
+                "times_opened": self.opened,
+                "rejected": self.rejected
+            }
+
+    def reset(self):
+        """Close the circuit and forget recorded outcomes"""
+        with self._lock:
+            self._close()
+
+    def _before_call(self) -> bool:
+        """Admit or reject a call; returns whether it is a half-open probe"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return False
+            if state == HALF_OPEN and self._probes_in_flight < self.probes:
+                self._probes_in_flight += 1
+                return True
+
+            self.rejected += 1
+            raise CircuitOpenError(self.name, self._retry_in())
+
+    def _after_call(self, probe: bool, ok: Optional[bool]):
+        """Record a call's outcome (None: not counted) and update the state"""
+        now = time.monotonic()
+        with self._lock:
+            if probe:
+                self._probes_in_flight -= 1
+                if ok is False:
+                    self._open(now)
+                elif ok:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self._close()
+                return
+
+            if ok is None or self._state != CLOSED:
+                return
+            self._outcomes.append((now, ok))
+            self._prune(now)
+
+            calls = len(self._outcomes)
+            failures = sum(1 for _, outcome in self._outcomes if not outcome)
+            if calls >= self.min_calls and failures / calls >= self.failure_rate:
+                self._open(now)
+
+    def _current_state(self) -> str:
+        """Get the state; callers must hold the lock"""
+        if self._state == OPEN and self._retry_in() <= 0:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    def _retry_in(self) -> float:
+        """Seconds until an open circuit lets a probe through"""
+        return max(self._opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def _open(self, now: float):
+        """Open the circuit; callers must hold the lock"""
+        self._state = OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.opened += 1
+
+    def _close(self):
+        """Close the circuit; callers must hold the lock"""
+        self._state = CLOSED
+        self._outcomes.clear()
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+    def _prune(self, now: float):
+        """Drop outcomes older than the window; callers must hold the lock"""
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """Get the shared breaker of an upstream, creating it on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def circuit_breaker_states() -> Dict[str, Dict]:
+    """Get a snapshot of every breaker, by upstream name"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
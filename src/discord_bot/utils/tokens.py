@@ -0,0 +1,30 @@
+"""
+Cheap token estimates for prompt budgeting.
+"""
+from typing import Dict
+
+# Tokens a chat message costs beyond its content (role, separators)
+MESSAGE_TOKEN_OVERHEAD = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the token count of a text (about 4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def estimate_message_tokens(content: str) -> int:
+    """Estimate the tokens a chat message with this content costs in a prompt"""
+    return estimate_tokens(content) + MESSAGE_TOKEN_OVERHEAD
+
+
+def estimate_messages_tokens(messages: list[Dict[str, str]]) -> int:
+    """Estimate the tokens of a list of chat messages"""
+    return sum(estimate_message_tokens(m["content"]) for m in messages)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = " […]") -> str:
+    """Cut a text so its estimate fits in max_tokens, keeping the beginning"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens * 4 - len(marker), 0)
+    return text[:keep].rstrip() + marker if keep else ""
@@ -0,0 +1,74 @@
+"""
+Tests for the AI client's retries and circuit breaker.
+"""
+import pytest
+
+from discord_bot.bot.ai_client import CIRCUIT_OPEN_MESSAGE, AIClient, AIClientError
+from discord_bot.bot.model_router import ModelRouter
+from discord_bot.config.settings import settings
+from discord_bot.utils.circuit_breaker import CLOSED, OPEN, CircuitBreaker
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """Client over one model whose upstream always answers 503"""
+    monkeypatch.setattr(type(settings), "AI_MAX_RETRIES", 3)
+    monkeypatch.setattr(type(settings), "AI_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(type(settings), "AI_REQUEST_DEADLINE", 5.0)
+
+    client = AIClient(api_key="test-key", model="test-model")
+    client.router = ModelRouter(["test-model"], hedge_delay_ms=0)
+    client._breaker = CircuitBreaker(
+        "test", failure_rate=0.5, min_calls=3, window=60, open_seconds=30, probes=1
+    )
+    client.upstream_calls = 0
+
+    async def unavailable(_payload):
+        client.upstream_calls += 1
+        raise AIClientError("unavailable", status=503)
+
+    client._complete_once = unavailable
+    return client
+
+
+@pytest.mark.asyncio
+async def test_retries_of_one_request_count_once(client):
+    with pytest.raises(AIClientError):
+        await client.complete(MESSAGES)
+
+    assert client.upstream_calls == 4  # first attempt and 3 retries
+    assert client._breaker.snapshot()["calls"] == 1
+    assert client._breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_circuit_opens_after_min_calls_failed_requests(client):
+    for _ in range(2):
+        with pytest.raises(AIClientError):
+            await client.complete(MESSAGES)
+        assert client._breaker.state == CLOSED
+
+    with pytest.raises(AIClientError):
+        await client.complete(MESSAGES)
+    assert client._breaker.state == OPEN
+
+    calls = client.upstream_calls
+    with pytest.raises(AIClientError, match=CIRCUIT_OPEN_MESSAGE):
+        await client.complete(MESSAGES)
+    assert client.upstream_calls == calls
+
+
+@pytest.mark.asyncio
+async def test_rejected_requests_do_not_open_the_circuit(client):
+    async def rejected(_payload):
+        raise AIClientError("bad request", status=400)
+
+    client._complete_once = rejected
+    for _ in range(5):
+        with pytest.raises(AIClientError):
+            await client.complete(MESSAGES)
+
+    assert client._breaker.state == CLOSED
+    assert client._breaker.snapshot()["calls"] == 0
@@ -0,0 +1,69 @@
+"""
+Tests for rendering streamed responses into Discord messages.
+"""
+import pytest
+
+from discord_bot.bot.ai_client import EMPTY_RESPONSE_MESSAGE, AIClientError
+from discord_bot.bot.client import DiscordBot
+
+
+class Message:
+    def __init__(self, content):
+        self.content = content
+
+    async def edit(self, content):
+        self.content = content
+
+
+class Channel:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content):
+        message = Message(content)
+        self.messages.append(message)
+        return message
+
+
+async def stream(*chunks, error=None):
+    for chunk in chunks:
+        yield chunk
+    if error:
+        raise error
+
+
+@pytest.fixture
+def bot():
+    return DiscordBot()
+
+
+@pytest.mark.asyncio
+async def test_streamed_reply_is_returned(bot):
+    channel = Channel()
+
+    response = await bot._send_streamed_response(channel, stream("Olá", ", mundo"))
+
+    assert response == "Olá, mundo"
+    assert [m.content for m in channel.messages] == ["Olá, mundo"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("chunks", [(), ("",), (" ", "\n\n")])
+async def test_empty_stream_counts_as_a_failure(bot, chunks):
+    channel = Channel()
+
+    response = await bot._send_streamed_response(channel, stream(*chunks))
+
+    assert response is None
+    assert [m.content for m in channel.messages] == [EMPTY_RESPONSE_MESSAGE]
+
+
+@pytest.mark.asyncio
+async def test_stream_error_is_shown_and_not_returned(bot):
+    channel = Channel()
+    chunks = stream("Olá", error=AIClientError("falhou"))
+
+    response = await bot._send_streamed_response(channel, chunks)
+
+    assert response is None
+    assert channel.messages[-1].content == "Olá\n\nfalhou"
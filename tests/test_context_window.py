@@ -0,0 +1,49 @@
+"""Tests for fitting summarization prompts into the context window."""
+import pytest
+
+from discord_bot.bot.context_window import ContextWindow
+from discord_bot.config.settings import settings
+from discord_bot.utils.tokens import estimate_messages_tokens
+
+
+@pytest.fixture
+def window(monkeypatch):
+    monkeypatch.setattr(type(settings), "AI_PROMPT_TOKEN_BUDGET", 400)
+    return ContextWindow([settings.OPENROUTER_MODEL])
+
+
+def turns(count, words=20):
+    return [
+        {"role": "user", "content": f"mensagem {i} " + "palavra " * words}
+        for i in range(count)
+    ]
+
+
+def test_summary_prompt_fits_and_drops_newest_turns(window):
+    messages = turns(100)
+
+    prompt = window.fit_summary(messages, "resumo " * 50)
+
+    assert prompt.tokens <= window.budget
+    assert estimate_messages_tokens(prompt.messages) == prompt.tokens
+    dropped = prompt.trimmed["history"]
+    assert 0 < dropped < len(messages)
+    covered = len(messages) - dropped
+    transcript = prompt.messages[-1]["content"]
+    assert f"mensagem {covered - 1} " in transcript
+    assert f"mensagem {covered} " not in transcript
+
+
+def test_single_long_turn_is_truncated(window):
+    prompt = window.fit_summary(turns(1, words=2000), "resumo " * 500)
+
+    assert prompt.tokens <= window.budget
+    assert prompt.trimmed["history"] == 0
+    assert prompt.trimmed["summary"] > 0
+    assert prompt.trimmed["user_message"] > 0
+
+
+def test_small_prompt_is_untouched(window):
+    prompt = window.fit_summary(turns(3, words=5))
+
+    assert not any(prompt.trimmed.values())
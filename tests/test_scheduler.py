@@ -0,0 +1,119 @@
+"""
+Tests for fair-share admission of AI requests.
+"""
+import asyncio
+
+import pytest
+
+from discord_bot.bot.scheduler import RequestScheduler
+
+
+def make_scheduler(group_weights=None):
+    """One slot, with no weights from the settings"""
+    return RequestScheduler(1, group_weights=group_weights or {}, user_weights={})
+
+
+async def queue_requests(scheduler, requests):
+    """Queue (user, group) requests behind a held slot; return the grant order"""
+    order = []
+
+    async def request(user_id, group):
+        async with scheduler.slot(user_id, group):
+            order.append((user_id, group))
+
+    await scheduler.acquire("holder")
+    tasks = []
+    for user_id, group in requests:
+        tasks.append(asyncio.create_task(request(user_id, group)))
+        await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+@pytest.mark.asyncio
+async def test_groups_take_turns():
+    scheduler = make_scheduler()
+    raid = [(f"raider{n}", "guild-a") for n in range(6)]
+
+    order = await queue_requests(scheduler, [*raid, ("quiet", "guild-b")])
+
+    assert order.index(("quiet", "guild-b")) <= 1
+    assert scheduler.snapshot()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_users_take_turns_within_a_group():
+    scheduler = make_scheduler()
+    spam = [("spammer", "guild-a")] * 6
+
+    order = await queue_requests(scheduler, [*spam, ("other", "guild-a")])
+
+    assert order.index(("other", "guild-a")) <= 1
+
+
+@pytest.mark.asyncio
+async def test_group_weights_give_a_bigger_share():
+    scheduler = make_scheduler(group_weights={"guild-a": 3})
+    requests = [(f"a{n}", "guild-a") for n in range(6)]
+    requests += [(f"b{n}", "guild-b") for n in range(6)]
+
+    order = await queue_requests(scheduler, requests)
+
+    first = [group for _, group in order[:8]]
+    assert first.count("guild-a") == 6
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    scheduler = make_scheduler()
+    await scheduler.acquire("holder")
+    waiting = asyncio.create_task(scheduler.acquire("waiter"))
+    await asyncio.sleep(0)
+    assert scheduler.snapshot()["queue_depth"] == 1
+
+    waiting.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+    assert scheduler.snapshot()["queue_depth"] == 0
+    scheduler.release()
+    assert scheduler.snapshot()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_request_releases_its_slot():
+    scheduler = make_scheduler()
+    started = asyncio.Event()
+
+    async def request():
+        async with scheduler.slot("user"):
+            started.set()
+            await asyncio.sleep(60)
+
+    running = asyncio.create_task(request())
+    await started.wait()
+    running.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await running
+
+    assert scheduler.snapshot()["in_flight"] == 0
+    await asyncio.wait_for(scheduler.acquire("next"), 1)
+
+
+@pytest.mark.asyncio
+async def test_slot_granted_to_a_cancelled_waiter_is_passed_on():
+    scheduler = make_scheduler()
+    await scheduler.acquire("holder")
+    first = asyncio.create_task(scheduler.acquire("first"))
+    second = asyncio.create_task(scheduler.acquire("second"))
+    await asyncio.sleep(0)
+
+    # The slot is granted to first, which is cancelled before it resumes
+    scheduler.release()
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+
+    await asyncio.wait_for(second, 1)
+    assert scheduler.snapshot()["in_flight"] == 1
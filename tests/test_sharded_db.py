@@ -0,0 +1,100 @@
+"""
+Tests for the sharded database's cross-shard queries.
+"""
+import pytest
+
+from discord_bot.config.settings import settings
+from discord_bot.database.sharded_db import ShardedDatabase
+from discord_bot.database.sqlite_db import SQLiteDatabase
+
+SHARDS = 3
+
+
+@pytest.fixture
+def make_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        type(settings), "SQLITE_ARCHIVE_PATH", str(tmp_path / "archive.db")
+    )
+    handles = []
+
+    def make(path=tmp_path / "bot.db"):
+        db = ShardedDatabase(SHARDS, str(path), write_behind=False)
+        handles.append(db)
+        return db
+
+    yield make
+    for db in handles:
+        db.close()
+
+
+@pytest.fixture
+def db(make_db):
+    """Sharded database with two users on every shard, five messages each"""
+    database = make_db()
+    database.init_database()
+
+    users = {}
+    candidate = 0
+    while len(users) < 2 * SHARDS:
+        user_id = f"user{candidate}"
+        index = database.shards.index(database.shard_for(user_id))
+        if sum(1 for owner in users.values() if owner == index) < 2:
+            users[user_id] = index
+        candidate += 1
+
+    for user_id in users:
+        for number in range(5):
+            database.save_message(user_id, "user", f"hello {user_id} {number}")
+    return database
+
+
+def search_all(db, query, limit, user_id=None):
+    pages, cursor = [], None
+    while True:
+        page = db.search_messages(query, user_id, limit, cursor)
+        pages.append(page["results"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return pages
+
+
+def test_search_pages_cover_every_shard_once(db):
+    pages = search_all(db, "hello", limit=4)
+    results = [result for page in pages for result in page]
+
+    assert all(len(page) <= 4 for page in pages)
+    assert len(results) == 2 * SHARDS * 5
+    assert len({(result["shard"], result["id"]) for result in results}) == len(results)
+    assert {result["shard"] for result in results} == set(range(SHARDS))
+    timestamps = [result["timestamp"] for result in results]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+
+def test_user_search_only_reads_the_owner_shard(db):
+    user_id = "user0"
+    owner = db.shards.index(db.shard_for(user_id))
+
+    pages = search_all(db, "hello", limit=2, user_id=user_id)
+    results = [result for page in pages for result in page]
+
+    assert len(results) == 5
+    assert {result["shard"] for result in results} == {owner}
+    assert {result["user_id"] for result in results} == {user_id}
+
+
+def test_search_rejects_a_cursor_for_another_shard_count(db):
+    with pytest.raises(ValueError):
+        db.search_messages("hello", cursor="5,3")
+
+
+def test_refuses_to_start_over_unsharded_messages(make_db, tmp_path):
+    # Characters with a meaning in URIs must not break the read-only check
+    path = tmp_path / "data #1?" / "bot.db"
+    path.parent.mkdir()
+    single = SQLiteDatabase(str(path), write_behind=False)
+    single.init_database()
+    single.save_message("user0", "user", "hello")
+    single.close()
+
+    with pytest.raises(RuntimeError):
+        make_db(path).init_database()
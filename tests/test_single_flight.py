@@ -0,0 +1,102 @@
+"""
+Tests for coalescing identical concurrent calls.
+"""
+import asyncio
+
+import pytest
+
+from discord_bot.bot.single_flight import SingleFlight
+
+
+class Upstream:
+    """Call that blocks until released, counting how often it started"""
+
+    def __init__(self):
+        self.started = 0
+        self.release = asyncio.Event()
+        self.error = None
+
+    async def __call__(self):
+        self.started += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return f"result {self.started}"
+
+
+async def join(flight, upstream, count):
+    """Start callers and wait for their shared call to reach the upstream"""
+    tasks = [asyncio.create_task(flight.run("key", upstream)) for _ in range(count)]
+    while not upstream.started:
+        await asyncio.sleep(0)
+    return tasks
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_call():
+    flight, upstream = SingleFlight(), Upstream()
+    tasks = await join(flight, upstream, 3)
+
+    upstream.release.set()
+
+    assert await asyncio.gather(*tasks) == ["result 1"] * 3
+    assert upstream.started == 1
+    assert flight.stats() == {
+        "in_flight": 0, "calls": 1, "coalesced": 2, "abandoned": 0
+    }
+
+
+@pytest.mark.asyncio
+async def test_failure_reaches_every_caller():
+    flight, upstream = SingleFlight(), Upstream()
+    tasks = await join(flight, upstream, 3)
+
+    upstream.error = RuntimeError("upstream down")
+    upstream.release.set()
+
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_first_caller_leaves_the_call_to_the_others():
+    flight, upstream = SingleFlight(), Upstream()
+    leader, *followers = await join(flight, upstream, 3)
+
+    leader.cancel()
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await asyncio.gather(*followers) == ["result 1"] * 2
+    assert leader.cancelled()
+    assert upstream.started == 1
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_when_every_caller_left():
+    flight, upstream = SingleFlight(), Upstream()
+    tasks = await join(flight, upstream, 2)
+    call = flight._calls["key"].task
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    assert call.cancelled()
+    assert flight.stats()["abandoned"] == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_waiters_restart_a_call_cancelled_from_outside():
+    flight, upstream = SingleFlight(), Upstream()
+    tasks = await join(flight, upstream, 2)
+
+    flight._calls["key"].task.cancel()
+    await asyncio.sleep(0)
+    upstream.release.set()
+
+    assert await asyncio.gather(*tasks) == ["result 2"] * 2
+    assert upstream.started == 2
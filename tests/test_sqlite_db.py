@@ -0,0 +1,132 @@
+"""
+Tests for the SQLite conversation store.
+"""
+import sqlite3
+
+import pytest
+
+from discord_bot.database.migrations import _message_search_index
+from discord_bot.database.retention import RetentionPolicy
+from discord_bot.database.sqlite_db import SQLiteDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    """Migrated database that writes through, without buffering"""
+    database = SQLiteDatabase(
+        str(tmp_path / "bot.db"),
+        write_behind=False,
+        archive_path=str(tmp_path / "archive.db")
+    )
+    database.init_database()
+    yield database
+    database.close()
+
+
+def save_messages(db, user_id, count, scope=""):
+    for index in range(count):
+        db.save_message(user_id, "user", f"message {index}", scope)
+
+
+def summarize(db, user_id, keep_recent, scope=""):
+    messages = db.get_messages_to_summarize(
+        user_id, 0, keep_recent=keep_recent, scope=scope
+    )
+    db.save_conversation_summary(user_id, "summary", messages[-1]["id"], scope)
+
+
+def contents(history):
+    return [message["content"] for message in history]
+
+
+def test_context_leaves_out_summarized_messages(db):
+    save_messages(db, "u1", 10)
+    summarize(db, "u1", keep_recent=4)
+
+    history, summary = db.get_conversation_context("u1", token_budget=10_000)
+
+    assert summary["summary"] == "summary"
+    assert contents(history) == [f"message {i}" for i in range(6, 10)]
+
+
+def test_cached_context_does_not_read_sqlite(db, monkeypatch):
+    save_messages(db, "u1", 10)
+    summarize(db, "u1", keep_recent=4)
+    db.get_conversation_context("u1", token_budget=10_000)
+    db.save_message("u1", "user", "new")
+
+    def no_reads():
+        raise AssertionError("read SQLite")
+
+    monkeypatch.setattr(db, "_reader", no_reads)
+    history, summary = db.get_conversation_context("u1", token_budget=10_000)
+
+    assert summary is not None
+    assert contents(history) == [f"message {i}" for i in range(6, 10)] + ["new"]
+
+
+def test_saving_a_summary_refreshes_the_cached_cutoff(db):
+    save_messages(db, "u1", 10)
+    summarize(db, "u1", keep_recent=4)
+    db.get_conversation_context("u1", token_budget=10_000)
+
+    save_messages(db, "u1", 4)  # cached without ids
+    summarize(db, "u1", keep_recent=2)
+    history, _ = db.get_conversation_context("u1", token_budget=10_000)
+
+    assert contents(history) == ["message 2", "message 3"]
+
+
+def test_clearing_history_drops_the_cached_summary(db):
+    save_messages(db, "u1", 10, scope="dm")
+    summarize(db, "u1", keep_recent=4, scope="dm")
+    db.get_conversation_context("u1", token_budget=10_000, scope="dm")
+
+    db.clear_user_history("u1", "dm")
+    db.save_message("u1", "user", "again", "dm")
+    history, summary = db.get_conversation_context(
+        "u1", token_budget=10_000, scope="dm"
+    )
+
+    assert summary is None
+    assert contents(history) == ["again"]
+
+
+def test_archiving_lowers_user_and_global_counts(db):
+    for user_id, count in (("u1", 6), ("u2", 3)):
+        db.add_user(user_id, user_id)
+        save_messages(db, user_id, count)
+
+    result = db.archive_old_messages(
+        RetentionPolicy(max_age_days=0, keep_per_user=2, batch_size=2)
+    )
+
+    assert result["archived"] == 5
+    assert db.get_user_stats("u1")["message_count"] == 2
+    assert db.get_user_stats("u2")["message_count"] == 2
+    assert db.get_total_stats()["total_messages"] == 4
+
+
+def test_search_picks_up_an_index_created_later(db):
+    save_messages(db, "u1", 3)
+    conn = sqlite3.connect(db.db_path)
+    conn.executescript("""
+        DROP TRIGGER trg_messages_fts_insert;
+        DROP TRIGGER trg_messages_fts_delete;
+        DROP TRIGGER trg_messages_fts_update;
+        DROP TABLE messages_fts;
+    """)
+    reader = SQLiteDatabase(db.db_path, read_only=True)
+
+    try:
+        # Without the index the search scans the table, and has no highlights
+        result = reader.search_messages("message 2")["results"][0]
+        assert result["snippet"] == "message 2"
+
+        with conn:
+            _message_search_index(conn.cursor())
+        result = reader.search_messages("message 2")["results"][0]
+        assert result["snippet"] == "[message] [2]"
+    finally:
+        reader.close()
+        conn.close()
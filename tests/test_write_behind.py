@@ -0,0 +1,114 @@
+"""
+Tests for the write-behind queue's retries and backpressure.
+"""
+import threading
+
+import pytest
+
+from discord_bot.database.write_behind import PendingMessage, WriteBehindQueue
+
+
+class FlakyStore:
+    """Flush target that fails its first calls, or any batch holding a poison row"""
+
+    def __init__(self, failures=0, poison=None):
+        self.failures = failures
+        self.poison = poison
+        self.calls = 0
+        self.rows = []
+
+    def __call__(self, batch):
+        self.calls += 1
+        if self.failures > 0:
+            self.failures -= 1
+            raise OSError("disk I/O error")
+        if any(message.content == self.poison for message in batch):
+            raise ValueError("bad row")
+        self.rows.extend(message.content for message in batch)
+
+
+@pytest.fixture
+def make_queue():
+    queues = []
+
+    def make(store, **kwargs):
+        # A long interval keeps the flusher thread out of the way
+        queue = WriteBehindQueue(store, interval_ms=60_000, **kwargs)
+        queues.append(queue)
+        return queue
+
+    yield make
+    for queue in queues:
+        queue.close()
+
+
+def enqueue(queue, *contents, user_id="u1"):
+    for content in contents:
+        queue.enqueue(PendingMessage.create(user_id, "user", content))
+
+
+def test_failed_batch_is_retried_before_newer_messages(make_queue):
+    store = FlakyStore(failures=1)
+    queue = make_queue(store, max_attempts=3)
+
+    enqueue(queue, "a", "b")
+    queue.flush()
+    assert store.rows == [] and queue.has_pending("u1")
+
+    enqueue(queue, "c")
+    queue.flush()
+
+    assert store.rows == ["a", "b", "c"]
+    assert not queue.has_pending()
+
+
+def test_batch_is_written_one_by_one_after_max_attempts(make_queue):
+    store = FlakyStore(poison="bad")
+    queue = make_queue(store, max_attempts=2)
+
+    enqueue(queue, "a", "bad", "b")
+    queue.flush()
+    assert store.rows == [] and queue.has_pending()
+    queue.flush()
+
+    assert store.rows == ["a", "b"]
+    assert queue.dropped == 1
+    assert not queue.has_pending()
+
+    enqueue(queue, "c")
+    queue.flush()
+    assert store.rows == ["a", "b", "c"]
+
+
+def test_enqueue_blocks_while_the_queue_is_full(make_queue):
+    store = FlakyStore()
+    release = threading.Event()
+
+    def slow_store(batch):
+        release.wait(5)
+        store(batch)
+
+    queue = make_queue(slow_store, max_pending=2)
+    enqueue(queue, "a", "b")
+
+    blocked = threading.Thread(target=enqueue, args=(queue, "c"))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    release.set()
+    blocked.join(1)
+    assert not blocked.is_alive()
+    queue.flush()
+    assert store.rows == ["a", "b", "c"]
+
+
+def test_close_gives_up_on_a_failing_batch(make_queue):
+    store = FlakyStore(failures=100)
+    queue = make_queue(store, max_attempts=2)
+    enqueue(queue, "a", "b")
+
+    queue.close()
+
+    assert queue.dropped == 2
+    assert not queue.has_pending()